@@ -0,0 +1,55 @@
+import pandas as pd
+import random
+import timeit
+
+from .main import get_background, parse_domains
+
+'''
+Usage:
+
+python3 -m saint_domain_enrich.benchmark_main
+
+Times building the domain index against a background taken from a SAINT
+file (--background file), using sizes similar to the human proteome.
+'''
+
+NO_ANNOTATED_GENES = 20000
+NO_DOMAIN_TYPES = 8000
+NO_SAINT_PREYS = 12000
+REPEATS = 5
+
+def create_domains(no_genes, no_domain_types):
+  rng = random.Random(0)
+  domains = {}
+  for id in range(no_genes):
+    elements = []
+    for _ in range(rng.randint(1, 6)):
+      start = rng.randint(1, 1000)
+      elements.append({
+        'name': f'domain{rng.randrange(no_domain_types)}',
+        'start': start,
+        'end': start + rng.randint(10, 200),
+      })
+    domains[str(id)] = elements
+  return domains
+
+def create_saint(no_preys, no_genes):
+  rng = random.Random(1)
+  preys = [str(id) for id in rng.sample(range(no_genes * 2), no_preys)]
+  return pd.DataFrame({ 'Prey': preys })
+
+def benchmark():
+  domains = create_domains(NO_ANNOTATED_GENES, NO_DOMAIN_TYPES)
+  saint = create_saint(NO_SAINT_PREYS, NO_ANNOTATED_GENES)
+
+  class Options:
+    background = 'file'
+
+  background = get_background(Options(), saint, domains)
+
+  seconds = min(timeit.repeat(lambda: parse_domains(domains, background), number=1, repeat=REPEATS))
+  print(f'parse_domains, background file: {len(domains)} annotated genes, {len(background)} background genes')
+  print(f'best of {REPEATS}: {seconds:.3f}s')
+
+if __name__ == '__main__':
+  benchmark()
@@ -1,9 +1,18 @@
 import argparse
 import csv
+import itertools
 import json
+import multiprocessing
+import numpy as np
 import os
 import pandas as pd
+import scipy.sparse as sparse
 import scipy.stats as stats
+import shutil
+import sys
+import uuid
+
+from openpyxl import Workbook
 
 '''
 Usage:
@@ -18,24 +27,68 @@ python3 main.py \
 -t 0
 
 output: domain-enrichment-saint.xlsx
+
+Several FDR and top prey settings can be compared in one run by supplying
+pipe-separated lists, e.g. -f "0.01|0.05" -t "0|10". Enrichment is calculated
+for every combination and written to domain-enrichment-sweep-saint.xlsx with
+the settings as columns.
+
+The domain and gene map files can be compiled into a binary index that loads
+much faster than the JSON. If -x is supplied to an enrichment run, the index is
+used when it is up to date with the JSON files and (re)built otherwise.
+
+python3 main.py build-index \
+-d domains.json \
+-g genemap.json \
+-x index
+
+output: index/
 '''
 
+ENRICHMENT_SHARD_TESTS = 100000
+
+INDEX_VERSION = 2
+
+WEIGHT_MATRICES = {
+  'count': 'counts',
+  'length': 'lengths',
+}
+
 def enrich():
   options = parse_args()
-  domains = read_domains(options.domains)
-  genemap = read_gene_map(options)
-  
   saint = read_saint(options.saint)
+
+  if options.index:
+    index = get_index(options)
+    genemap = read_gene_map_from_index(index, options.idtype, saint.Prey.str.split('.').str[0].unique())
+    domains = read_domain_genes_from_index(index)
+  else:
+    domains = read_domains(options.domains)
+    genemap = read_gene_map(options)
+
   saint_mapped = map_file_ids(saint, genemap)
-  filtered_saint = filter_saint(options, saint_mapped)
 
   background = get_background(options, saint_mapped, domains)
 
-  domains_by_id, ids_by_domain = parse_domains(domains, background)
-  domains_by_bait = count_domains_by_bait(filtered_saint, domains_by_id)
-  enriched_domains_by_bait = calculate_enrichment(domains_by_bait, ids_by_domain, len(background), options.fdr)
+  if options.index:
+    domain_matrix = create_domain_matrix_from_index(index, background)
+  else:
+    domains_by_id, ids_by_domain = parse_domains(domains, background)
+    domain_matrix = create_domain_matrix(domains_by_id, ids_by_domain)
 
-  write_enriched_domains(options, enriched_domains_by_bait)
+  domain_ranks = None
+  if options.weight != 'none':
+    domain_ranks = rank_domain_values(domain_matrix[WEIGHT_MATRICES[options.weight]])
+
+  pvalue_cache = create_pvalue_cache()
+  def enrich_setting(setting):
+    filtered_saint = filter_saint(setting, saint_mapped)
+    domains_by_bait = count_domains_by_bait(filtered_saint, domain_matrix, domain_ranks)
+    return iterate_enrichment(domains_by_bait, domain_matrix, len(background), setting.fdr, options.workers, pvalue_cache)
+
+  settings = get_settings(options)
+  write_enriched_domains(options, settings, ((setting, enrich_setting(setting)) for setting in settings))
+  print(f'p-value cache: {pvalue_cache["hits"]} hits, {pvalue_cache["misses"]} misses')
 
 def parse_args():
   parser = argparse.ArgumentParser(description='Perform domain/motif enrichment')
@@ -54,9 +107,9 @@ def parse_args():
   )
   parser.add_argument(
     '--fdr', '-f',
-    default=0.01,
-    help='FDR for significant preys (default: %(default).2f)',
-    type=float,
+    default=[0.01],
+    help='FDR for significant preys, or a pipe-separated list of FDRs to compare (default: 0.01)',
+    type=parse_list(float),
   )
   parser.add_argument(
     '--genemap', '-g',
@@ -69,6 +122,12 @@ def parse_args():
     default='refseqp',
     help='The type of identifier in the "Prey" column',
   )
+  parser.add_argument(
+    '--index', '-x',
+    default='',
+    help='Directory for a binary index of the domain and gene map files. It is built '
+      'if missing or out of date with the JSON files',
+  )
   parser.add_argument(
     '--saint', '-s',
     default='',
@@ -77,13 +136,56 @@ def parse_args():
   )
   parser.add_argument(
     '--top_preys', '-t',
-    default=0,
-    help='Only use top preys for enrichment (default: %(default)d)',
+    default=[0],
+    help='Only use top preys for enrichment, or a pipe-separated list of values to compare (default: 0)',
+    type=parse_list(int),
+  )
+  parser.add_argument(
+    '--weight', '-wt',
+    choices=['count', 'length', 'none'],
+    default='length',
+    help='Also test if preys with a domain have more copies (count) or more coverage (length) '
+      'of the domain than other background genes with it, using a rank-sum test (default: %(default)s)',
+  )
+  parser.add_argument(
+    '--workers', '-w',
+    default=1,
+    help='Number of processes for testing baits (default: %(default)d)',
     type=int,
   )
 
   return parser.parse_args()
 
+def parse_list(value_type):
+  return lambda x: [value_type(value) for value in str(x).split('|')]
+
+def parse_build_index_args(args):
+  parser = argparse.ArgumentParser(
+    description='Compile domain and gene map files into a binary index',
+    prog='main.py build-index',
+  )
+
+  parser.add_argument(
+    '--domains', '-d',
+    default='',
+    help='Domains for every gene in JSON format, with HUGO gene IDs as keys and an array of domain names',
+    required=True,
+  )
+  parser.add_argument(
+    '--genemap', '-g',
+    default='',
+    help='A file in JSON formatting mapping HUGO gene IDs to different identifiers',
+    required=True,
+  )
+  parser.add_argument(
+    '--index', '-x',
+    default='',
+    help='Output directory for the index',
+    required=True,
+  )
+
+  return parser.parse_args(args)
+
 def read_domains(domainfile):
   with open(domainfile) as json_data:
     return json.load(json_data)
@@ -111,6 +213,232 @@ def read_gene_map(options):
       parse_ids(ids, genemap, hugoid)
     return genemap
 
+def get_file_fingerprint(filepath):
+  stat = os.stat(filepath)
+  return {
+    'mtime_ns': stat.st_mtime_ns,
+    'size': stat.st_size,
+  }
+
+def encode_ids(ids):
+  return np.array([id.encode('utf-8') for id in ids], dtype=bytes)
+
+def find_ids(sorted_ids, ids):
+  '''
+  Find the positions of ids in a sorted array of encoded ids. Returns the
+  positions, a mask of the ids that were found and the (string) ids searched.
+  '''
+  ids = [id for id in ids if isinstance(id, str)]
+  if len(ids) == 0 or len(sorted_ids) == 0:
+    return np.empty(0, dtype=np.int64), np.empty(0, dtype=bool), ids
+
+  encoded = encode_ids(ids)
+  positions = np.minimum(np.searchsorted(sorted_ids, encoded), len(sorted_ids) - 1)
+  return positions, sorted_ids[positions] == encoded, ids
+
+def build_index(domainfile, genemapfile, index_dir):
+  '''
+  Compile the domain and gene map files into a directory of numpy arrays.
+  Gene IDs are interned, with genes that have domains stored first. Domains
+  are stored per gene in CSR form with the copy number and summed length of
+  each domain, and every identifier type in the gene map gets a sorted lookup
+  table of identifiers and the index of the gene they map to.
+
+  Arrays are written to a new subdirectory that the manifest is then atomically
+  switched to, so runs reading (memory-mapping) an existing index are never
+  affected by a rebuild. The previous subdirectory is kept for runs that have
+  just read the old manifest; older ones are removed.
+  '''
+  domain_list_by_id = read_domains(domainfile)
+  with open(genemapfile) as json_data:
+    genemap = json.load(json_data)
+
+  gene_index = {}
+  domain_index = {}
+  indptr = [0]
+  indices = []
+  counts = []
+  lengths = []
+  for id, domains in domain_list_by_id.items():
+    gene_index[id] = len(gene_index)
+    elements = {}
+    for domain in domains:
+      if domain['name'] not in domain_index:
+        domain_index[domain['name']] = len(domain_index)
+      if domain['name'] not in elements:
+        elements[domain['name']] = [0, 0]
+      elements[domain['name']][0] += 1
+      elements[domain['name']][1] += (domain['end'] - domain['start'] + 1)
+    for domain, (count, length) in elements.items():
+      indices.append(domain_index[domain])
+      counts.append(count)
+      lengths.append(length)
+    indptr.append(len(indices))
+  no_domain_genes = len(gene_index)
+
+  ids_by_idtype = {}
+  for hugoid, ids in genemap.items():
+    if hugoid not in gene_index:
+      gene_index[hugoid] = len(gene_index)
+    for idtype, value in ids.items():
+      if idtype not in ids_by_idtype:
+        ids_by_idtype[idtype] = {}
+      values = value if isinstance(value, list) else [value]
+      for id in values:
+        if isinstance(id, str):
+          ids_by_idtype[idtype][id] = gene_index[hugoid]
+
+  genes = encode_ids(gene_index.keys())
+  arrays = {
+    'domain_counts': np.array(counts, dtype=np.int32),
+    'domain_indices': np.array(indices, dtype=np.int32),
+    'domain_indptr': np.array(indptr, dtype=np.int64),
+    'domain_lengths': np.array(lengths, dtype=np.int64),
+    'domains': encode_ids(domain_index.keys()),
+    'gene_order': np.argsort(genes, kind='stable').astype(np.int32),
+    'genes': genes,
+  }
+  for idtype, id_map in ids_by_idtype.items():
+    keys = encode_ids(id_map.keys())
+    order = np.argsort(keys, kind='stable')
+    arrays[f'idtype_{idtype}_keys'] = keys[order]
+    arrays[f'idtype_{idtype}_genes'] = np.array(list(id_map.values()), dtype=np.int32)[order]
+
+  os.makedirs(index_dir, exist_ok=True)
+  # Named uniquely rather than with tempfile so permissions follow the umask,
+  # as the index may be shared with other users.
+  build_id = uuid.uuid4().hex
+  arrays_dir = os.path.join(index_dir, f'arrays-{build_id}')
+  os.mkdir(arrays_dir)
+  build_start = os.stat(arrays_dir).st_mtime_ns
+  for name, array in arrays.items():
+    np.save(os.path.join(arrays_dir, f'{name}.npy'), array)
+
+  # The manifest is replaced last so an interrupted build is never treated as current.
+  manifest = {
+    'arrays': os.path.basename(arrays_dir),
+    'idtypes': list(ids_by_idtype.keys()),
+    'no_domain_genes': no_domain_genes,
+    'sources': {
+      'domains': get_file_fingerprint(domainfile),
+      'genemap': get_file_fingerprint(genemapfile),
+    },
+    'version': INDEX_VERSION,
+  }
+  manifestfile = os.path.join(index_dir, 'manifest.json')
+  previous_arrays = read_manifest(manifestfile).get('arrays') if os.path.isfile(manifestfile) else None
+  tmp_manifestfile = os.path.join(index_dir, f'manifest-{build_id}.json.tmp')
+  with open(tmp_manifestfile, 'w') as f:
+    json.dump(manifest, f)
+  os.replace(tmp_manifestfile, manifestfile)
+
+  remove_old_index_files(index_dir, [manifest['arrays'], previous_arrays], build_start)
+
+def read_manifest(manifestfile):
+  with open(manifestfile) as json_data:
+    return json.load(json_data)
+
+def remove_old_index_files(index_dir, keep, before):
+  '''
+  Remove array subdirectories not in keep that were last written before the
+  given time (in ns), so builds still in progress are left alone, as well as
+  arrays stored directly in the index directory by earlier index versions.
+  Removing (unlinking) files does not affect runs that have them memory-mapped.
+  '''
+  for entry in os.scandir(index_dir):
+    if entry.is_dir() and entry.name.startswith('arrays-'):
+      if entry.name not in keep and entry.stat().st_mtime_ns < before:
+        shutil.rmtree(entry.path, ignore_errors=True)
+    elif entry.is_file() and entry.name.endswith('.npy'):
+      os.remove(entry.path)
+
+def is_index_current(index_dir, domainfile, genemapfile):
+  manifestfile = os.path.join(index_dir, 'manifest.json')
+  if not os.path.isfile(manifestfile):
+    return False
+
+  manifest = read_manifest(manifestfile)
+
+  return (
+    manifest.get('version') == INDEX_VERSION and
+    manifest['sources']['domains'] == get_file_fingerprint(domainfile) and
+    manifest['sources']['genemap'] == get_file_fingerprint(genemapfile)
+  )
+
+def read_index(index_dir):
+  '''
+  Read an index created by build_index. Arrays are memory-mapped rather than
+  read into memory.
+  '''
+  index = read_manifest(os.path.join(index_dir, 'manifest.json'))
+  arrays_dir = os.path.join(index_dir, index['arrays'])
+
+  for filename in os.listdir(arrays_dir):
+    name, extension = os.path.splitext(filename)
+    if extension == '.npy':
+      index[name] = np.load(os.path.join(arrays_dir, filename), mmap_mode='r')
+
+  return index
+
+def get_index(options):
+  if not is_index_current(options.index, options.domains, options.genemap):
+    build_index(options.domains, options.genemap, options.index)
+  return read_index(options.index)
+
+def read_gene_map_from_index(index, idtype, ids):
+  '''
+  Create a map of the requested identifiers to HUGO gene IDs, equivalent to
+  the subset of read_gene_map for these ids.
+  '''
+  if idtype not in index['idtypes']:
+    raise KeyError(idtype)
+
+  positions, found, ids = find_ids(index[f'idtype_{idtype}_keys'], ids)
+  gene_indices = index[f'idtype_{idtype}_genes'][positions[found]]
+  hugoids = [id.decode('utf-8') for id in index['genes'][gene_indices]]
+
+  return dict(zip(np.array(ids, dtype=object)[found], hugoids))
+
+def read_domain_genes_from_index(index):
+  return [id.decode('utf-8') for id in index['genes'][:index['no_domain_genes']]]
+
+def create_domain_matrix_from_index(index, background_ids):
+  '''
+  Create the domain matrices (see create_domain_matrix) for the background genes
+  from an index. Genes and domains are ordered as parse_domains would order them.
+  '''
+  no_domain_genes = index['no_domain_genes']
+
+  positions, found, _ = find_ids(index['genes'][index['gene_order']], background_ids)
+  rows = np.unique(index['gene_order'][positions[found]])
+  rows = rows[rows < no_domain_genes]
+
+  shape = (no_domain_genes, len(index['domains']))
+  indptr = np.asarray(index['domain_indptr'])
+  indices = np.asarray(index['domain_indices'])
+  counts = sparse.csr_matrix((np.asarray(index['domain_counts']), indices, indptr), shape=shape)[rows]
+  lengths = sparse.csr_matrix((np.asarray(index['domain_lengths']), indices, indptr), shape=shape)[rows]
+
+  # order domains by the first gene they are seen in, as parse_domains does
+  used_domains, first_seen = np.unique(counts.indices, return_index=True)
+  column_order = used_domains[np.argsort(first_seen)]
+  remap = np.full(shape[1], -1, dtype=np.int64)
+  remap[column_order] = np.arange(len(column_order))
+  domain_indices = remap[counts.indices]
+
+  shape = (len(rows), len(column_order))
+  genes = [id.decode('utf-8') for id in index['genes'][rows]]
+
+  return {
+    'background_counts': np.bincount(domain_indices, minlength=len(column_order)),
+    'counts': sparse.csr_matrix((counts.data.astype(np.int64), domain_indices, counts.indptr), shape=shape),
+    'domains': [domain.decode('utf-8') for domain in index['domains'][column_order]],
+    'gene_index': {id: index for index, id in enumerate(genes)},
+    'genes': genes,
+    'incidence': sparse.csr_matrix((np.ones(len(domain_indices), dtype=np.int64), domain_indices, counts.indptr), shape=shape),
+    'lengths': sparse.csr_matrix((lengths.data.astype(np.int64), domain_indices, lengths.indptr), shape=shape),
+  }
+
 def read_saint(saintfile):
   columns = ['Bait', 'Prey', 'PreyGene', 'AvgSpec', 'BFDR']
   return pd.read_csv(saintfile, sep='\t', usecols=columns)
@@ -121,6 +449,16 @@ def map_file_ids(saint, genemap):
   mapped.Prey = mapped.Prey.map(genemap).fillna(mapped.Prey)
   return mapped
 
+def get_settings(options):
+  '''
+  Every combination of the FDR and top prey settings to calculate enrichment for.
+  '''
+  return [
+    argparse.Namespace(fdr=fdr, top_preys=top_preys)
+    for fdr in options.fdr
+    for top_preys in options.top_preys
+  ]
+
 def filter_saint(options, saint):
   fdr = options.fdr
   top_preys = options.top_preys
@@ -137,7 +475,7 @@ def filter_saint(options, saint):
 def get_background(options, saint, domains):
   background = options.background
   if background == 'all':
-    return list(domains.keys())
+    return list(domains)
 
   return list(saint.Prey.unique())
 
@@ -145,6 +483,7 @@ def parse_domains(domain_list_by_id, background_ids):
   ids_by_domain = {}
   domains_by_id = {}
 
+  background_ids = set(background_ids)
   for id, domains in domain_list_by_id.items():
     if id in background_ids:
       elements = {}
@@ -165,92 +504,317 @@ def parse_domains(domain_list_by_id, background_ids):
 
   return domains_by_id, ids_by_domain
 
-def count_domains_by_bait(saint, domains_by_id):
-  domains_by_bait = {}
-
-  baits = list(saint.Bait.unique())
-  preyLookup = pd.Series(saint.PreyGene.values, index=saint.Prey).to_dict()
+def create_domain_matrix(domains_by_id, ids_by_domain):
+  '''
+  Store the domain annotations as sparse gene x domain matrices. "incidence" is 1
+  when a gene has a domain, "counts" holds the number of copies of the domain in
+  the gene and "lengths" their summed length. "background_counts" is the number of
+  genes with each domain.
+  '''
+  genes = list(domains_by_id.keys())
+  domains = list(ids_by_domain.keys())
+  domain_index = {domain: index for index, domain in enumerate(domains)}
+
+  indptr = [0]
+  indices = []
+  counts = []
+  lengths = []
+  for id in genes:
+    for domain, domain_data in domains_by_id[id].items():
+      indices.append(domain_index[domain])
+      counts.append(domain_data['count'])
+      lengths.append(domain_data['length'])
+    indptr.append(len(indices))
+
+  indptr = np.array(indptr, dtype=np.int64)
+  indices = np.array(indices, dtype=np.int64)
+  shape = (len(genes), len(domains))
+
+  return {
+    'background_counts': np.bincount(indices, minlength=len(domains)),
+    'counts': sparse.csr_matrix((np.array(counts, dtype=np.int64), indices, indptr), shape=shape),
+    'domains': domains,
+    'gene_index': {id: index for index, id in enumerate(genes)},
+    'genes': genes,
+    'incidence': sparse.csr_matrix((np.ones(len(indices), dtype=np.int64), indices, indptr), shape=shape),
+    'lengths': sparse.csr_matrix((np.array(lengths, dtype=np.int64), indices, indptr), shape=shape),
+  }
+
+def rank_domain_values(values):
+  '''
+  Rank the values (domain copy numbers or lengths) in a gene x domain matrix
+  within each domain, i.e. among the background genes with the domain. Ties get
+  their mean rank. Returns a matrix of ranks with the same sparsity as values and
+  the tie correction term, sum(t^3 - t) over tie groups, for each domain.
+  '''
+  values = values.tocsc()
+  no_domains = values.shape[1]
+  columns = np.repeat(np.arange(no_domains), np.diff(values.indptr))
+
+  order = np.lexsort((values.data, columns))
+  sorted_values = values.data[order]
+  sorted_columns = columns[order]
+  positions = np.arange(1, len(order) + 1) - values.indptr[sorted_columns]
+
+  is_new_group = np.ones(len(order), dtype=bool)
+  is_new_group[1:] = (sorted_values[1:] != sorted_values[:-1]) | (sorted_columns[1:] != sorted_columns[:-1])
+  groups = np.cumsum(is_new_group) - 1
+  group_sizes = np.bincount(groups)
+  mean_ranks = np.bincount(groups, weights=positions) / group_sizes
+
+  ranks = np.empty(len(order))
+  ranks[order] = mean_ranks[groups]
+
+  return {
+    'ranks': sparse.csc_matrix((ranks, values.indices, values.indptr), shape=values.shape).tocsr(),
+    'tie_correction': np.bincount(
+      sorted_columns[is_new_group],
+      weights=group_sizes ** 3 - group_sizes,
+      minlength=no_domains,
+    ),
+  }
+
+def count_domains_by_bait(saint, domain_matrix, domain_ranks=None):
+  '''
+  Count the preys with each domain for every bait. The significant preys are
+  stored as a sparse bait x gene matrix, so multiplying it by the domain incidence
+  matrix gives the per-domain prey counts for all baits at once. The genes
+  for each bait are kept in file order so prey lists can be built later for the
+  domains that are enriched. If domain_ranks (see rank_domain_values) are given,
+  the rank sums of each bait's preys in every domain are calculated the same way.
+  '''
+  bait_codes, baits = pd.factorize(saint.Bait)
+  gene_rows = saint.Prey.map(domain_matrix['gene_index'])
+  in_database = gene_rows.notna().to_numpy()
+
+  rows = bait_codes[in_database]
+  columns = gene_rows[in_database].to_numpy(dtype=np.int64)
+  significance = sparse.csr_matrix(
+    (np.ones(len(rows), dtype=np.int64), (rows, columns)),
+    shape=(len(baits), len(domain_matrix['genes'])),
+  )
 
-  for bait in baits:
-    domains_by_bait[bait] = {
-      'preysInDatabase': 0,
-      'domain': {},
-    }
+  order = np.argsort(rows, kind='stable')
+  splits = np.cumsum(np.bincount(rows, minlength=len(baits)))[:-1]
 
-    prey_ids = list(saint.Prey[saint.Bait == bait])
-    for prey_id in prey_ids:
-      if prey_id and prey_id in domains_by_id:
-        domains_by_bait[bait]['preysInDatabase'] += 1
+  domain_counts = (significance @ domain_matrix['incidence']).tocsr()
+  domain_counts.eliminate_zeros()
 
-        for domain, domain_data in domains_by_id[prey_id].items():
-          if domain not in domains_by_bait[bait]['domain']:
-            domains_by_bait[bait]['domain'][domain] = {
-              'countByAccession': [],
-              'lengthByAccession': [],
-              'preys': [],
-            }
+  domains_by_bait = {
+    'baits': list(baits),
+    'domain_counts': domain_counts,
+    'prey_lookup': pd.Series(saint.PreyGene.values, index=saint.Prey).to_dict(),
+    'preys_by_bait': np.split(columns[order], splits),
+    'preys_in_database': np.asarray(significance.sum(axis=1)).ravel(),
+  }
 
-          domains_by_bait[bait]['domain'][domain]['countByAccession'].append(domain_data['count'])
-          domains_by_bait[bait]['domain'][domain]['lengthByAccession'].append(domain_data['length'])
-          domains_by_bait[bait]['domain'][domain]['preys'].append(preyLookup[prey_id])
+  if domain_ranks is not None:
+    domains_by_bait['rank_sums'] = (significance @ domain_ranks['ranks']).tocsr()
+    domains_by_bait['rank_tie_correction'] = domain_ranks['tie_correction']
 
   return domains_by_bait
 
-def calculate_enrichment(domains_by_bait, ids_by_domain, background_size, fdr):
-  enriched_domains_by_bait = {}
-
-  def perform_domain_enrichment(bait_data, preys_in_database):
-    # sourcery skip: inline-immediately-returned-variable, list-comprehension
-    pvalues = {}
-    stats = {}
-
-    for domain, domain_data in bait_data.items():
-      prey_count = len(domain_data['preys'])
-      bait_fold_enrichment = prey_count / preys_in_database
-      background_size_w_domain = len(ids_by_domain[domain])
-      background_fold_enrichment = background_size_w_domain / background_size
-      fold_enrichment = bait_fold_enrichment / background_fold_enrichment
-
-      pvalue = fishers_test(
-        prey_count,
-        preys_in_database,
-        background_size_w_domain,
-        background_size,
-      )
-      pvalues[domain] = pvalue
-      stats[domain] = {
-        'background_size_w_domain': background_size_w_domain,
-        'fold_enrichment': fold_enrichment,
-        'pvalue': pvalue,
-      }
-
-    adj_pvalues, corrected_fdr = bh_correction(pvalues, fdr)
+def calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers=1, pvalue_cache=None):
+  '''
+  Test every bait-domain pair with at least one prey for enrichment and return
+  a dict of the enriched domains for every bait (see iterate_enrichment).
+  '''
+  return dict(iterate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers, pvalue_cache))
+
+def iterate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers=1, pvalue_cache=None):
+  '''
+  Test every bait-domain pair with at least one prey for enrichment, yielding
+  each bait with its enriched domains in order. Baits are tested in contiguous
+  shards of about ENRICHMENT_SHARD_TESTS tests, so only one shard's results are
+  held at a time. With more than one worker, shards are tested in forked processes
+  sharing the (read-only) count and domain matrices, and baits are yielded as their
+  shard finishes. P-values are memoized in pvalue_cache (see create_pvalue_cache), which can be
+  passed in to share it between calls.
+  '''
+  no_baits = len(domains_by_bait['baits'])
+  if pvalue_cache is None:
+    pvalue_cache = create_pvalue_cache()
+
+  if workers > 1 and no_baits > 1 and 'fork' in multiprocessing.get_all_start_methods():
+    shard_results = compute_enrichment_in_parallel(domains_by_bait, domain_matrix, background_size, fdr, workers, pvalue_cache)
+  else:
+    shard_results = (
+      (start, end, compute_enrichment(domains_by_bait, domain_matrix, background_size, fdr, start, end, pvalue_cache))
+      for start, end in split_baits(domains_by_bait['domain_counts'])
+    )
+
+  for start, end, results in shard_results:
+    yield from format_enrichment(results, start, end, domains_by_bait, domain_matrix, background_size)
+
+def compute_enrichment(domains_by_bait, domain_matrix, background_size, fdr, start, end, pvalue_cache):
+  '''
+  Test the domains for baits start to end - 1. The contingency tables are read
+  from the sparse count matrix so the Fisher's tests are evaluated in a single
+  call, and the p-values are then corrected per bait. Returns arrays describing
+  the enriched tests, ordered by bait and adjusted p-value. The preys with each
+  enriched domain are returned as gene rows, with "gene_counts" preys per test.
+  '''
+  domain_counts = domains_by_bait['domain_counts'][start:end].tocoo()
+  order = np.lexsort((domain_counts.col, domain_counts.row))
+  bait_indices = domain_counts.row[order].astype(np.int64) + start
+  domain_indices = domain_counts.col[order].astype(np.int64)
+  prey_counts = domain_counts.data[order].astype(np.int64)
+  bait_offsets = np.searchsorted(bait_indices, np.arange(start, end + 1))
+
+  preys_in_database = domains_by_bait['preys_in_database'][bait_indices]
+  background_sizes_w_domain = domain_matrix['background_counts'][domain_indices]
+
+  pvalues = cached_fishers_test(prey_counts, preys_in_database, background_sizes_w_domain, background_size, pvalue_cache)
+  fold_enrichments = (prey_counts / preys_in_database) / (background_sizes_w_domain / background_size)
+  adj_pvalues, corrected_fdr = bh_correction_by_group(pvalues, bait_offsets, fdr)
+
+  rank_sum_pvalues = None
+  if 'rank_sums' in domains_by_bait:
+    # Fancy indexing with empty arrays returns a sparse matrix, not a dense one.
+    if len(bait_indices):
+      rank_sums = np.asarray(domains_by_bait['rank_sums'][bait_indices, domain_indices]).ravel()
+    else:
+      rank_sums = np.empty(0)
+    rank_sum_pvalues = rank_sum_test(
+      rank_sums,
+      prey_counts,
+      background_sizes_w_domain,
+      domains_by_bait['rank_tie_correction'][domain_indices],
+    )
+
+  # Enriched tests ordered by bait, then adjusted p-value. Ties keep the order
+  # bh_correction returns them in: descending p-value, then descending position.
+  positions = np.arange(len(pvalues))
+  enriched = np.lexsort((-positions, -pvalues, adj_pvalues, bait_indices))
+  enriched = enriched[(adj_pvalues[enriched] == 0) | (adj_pvalues[enriched] < corrected_fdr[enriched])]
+  enriched_offsets = np.searchsorted(bait_indices[enriched], np.arange(start, end + 1))
+
+  gene_rows = []
+  gene_counts = []
+  for bait_index in range(start, end):
+    tests = enriched[enriched_offsets[bait_index - start]:enriched_offsets[bait_index - start + 1]]
+    if len(tests) == 0:
+      continue
+
+    prey_rows = domains_by_bait['preys_by_bait'][bait_index]
+    has_domain = domain_matrix['incidence'][prey_rows][:, domain_indices[tests]].toarray()
+    for column in range(len(tests)):
+      rows = prey_rows[np.flatnonzero(has_domain[:, column])]
+      gene_rows.append(rows)
+      gene_counts.append(len(rows))
+
+  results = {
+    'adj_pvalue': adj_pvalues[enriched],
+    'background_size_w_domain': background_sizes_w_domain[enriched],
+    'bait': bait_indices[enriched],
+    'bh_fdr': corrected_fdr[enriched],
+    'domain': domain_indices[enriched],
+    'fold_enrichment': fold_enrichments[enriched],
+    'gene_counts': np.array(gene_counts, dtype=np.int64),
+    'gene_rows': np.concatenate(gene_rows) if gene_rows else np.empty(0, dtype=np.int64),
+    'prey_count': prey_counts[enriched],
+    'pvalue': pvalues[enriched],
+  }
+  if rank_sum_pvalues is not None:
+    results['rank_sum_pvalue'] = rank_sum_pvalues[enriched]
+
+  return results
+
+def split_baits(domain_counts, min_shards=1, shard_tests=ENRICHMENT_SHARD_TESTS):
+  '''
+  Split the baits (rows of the count matrix) into contiguous shards with similar
+  numbers of tests: at least min_shards shards, and enough of them for each to
+  hold about shard_tests tests as far as bait boundaries allow. Returns the
+  (start, end) bounds of the shards.
+  '''
+  no_baits = domain_counts.shape[0]
+  if no_baits == 0:
+    return []
+
+  indptr = domain_counts.indptr
+  no_shards = min(no_baits, max(min_shards, -(-indptr[-1] // shard_tests)))
+  targets = np.linspace(0, indptr[-1], no_shards + 1)
+  boundaries = np.unique(np.concatenate(([0], np.searchsorted(indptr, targets[1:-1]), [no_baits])))
+  return list(zip(boundaries[:-1].tolist(), boundaries[1:].tolist()))
+
+_shared_enrichment_data = None
+
+def compute_enrichment_shard(bounds):
+  '''
+  Test a shard of baits in a worker. Returns the shard's results with the cache hits
+  and misses, and the tables and p-values added to the cache as arrays.
+  '''
+  pvalue_cache = _shared_enrichment_data[-1]
+  hits, misses = pvalue_cache['hits'], pvalue_cache['misses']
+  no_cached = len(pvalue_cache['pvalues'])
+  results = compute_enrichment(*_shared_enrichment_data[:-1], *bounds, pvalue_cache)
+
+  new_entries = list(itertools.islice(pvalue_cache['pvalues'].items(), no_cached, None))
+  tables = np.array([table for table, _ in new_entries], dtype=np.int64).reshape(-1, 4)
+  pvalues = np.array([pvalue for _, pvalue in new_entries], dtype=float)
+  return bounds, results, pvalue_cache['hits'] - hits, pvalue_cache['misses'] - misses, tables, pvalues
+
+def compute_enrichment_in_parallel(domains_by_bait, domain_matrix, background_size, fdr, workers, pvalue_cache):
+  '''
+  Split baits into contiguous shards with similar numbers of tests and test
+  them in a pool of forked processes. The inputs are made available to workers
+  through a module variable, so they are inherited by the fork rather than copied,
+  and only the compact result arrays are sent back. Yields the bounds and results
+  of each shard in bait order. Workers start with a copy of the p-value cache and
+  send back their hits, misses and new entries, which are added to the parent's cache.
+  '''
+  global _shared_enrichment_data
+
+  shards = split_baits(domains_by_bait['domain_counts'], workers * 4)
+
+  _shared_enrichment_data = (domains_by_bait, domain_matrix, background_size, fdr, pvalue_cache)
+  try:
+    with multiprocessing.get_context('fork').Pool(workers) as pool:
+      for (start, end), results, hits, misses, tables, pvalues in pool.imap(compute_enrichment_shard, shards):
+        pvalue_cache['hits'] += hits
+        pvalue_cache['misses'] += misses
+        pvalue_cache['pvalues'].update(zip(map(tuple, tables.tolist()), pvalues.tolist()))
+        yield start, end, results
+  finally:
+    _shared_enrichment_data = None
+
+def format_enrichment(results, start, end, domains_by_bait, domain_matrix, background_size):
+  '''
+  Convert the result arrays from compute_enrichment for baits start to end - 1
+  to a list of enriched domains, yielding each bait and its list in turn.
+  '''
+  baits = domains_by_bait['baits']
+  domain_names = domain_matrix['domains']
+  gene_ids = domain_matrix['genes']
+  prey_lookup = domains_by_bait['prey_lookup']
+  preys_in_database = domains_by_bait['preys_in_database']
+
+  bait_offsets = np.searchsorted(results['bait'], np.arange(start, end + 1))
+  gene_offsets = np.concatenate(([0], np.cumsum(results['gene_counts'])))
+  column_names = [key for key in results.keys() if key not in ['bait', 'gene_counts', 'gene_rows']]
+
+  for bait_index in range(start, end):
+    first, last = bait_offsets[bait_index - start], bait_offsets[bait_index - start + 1]
+    columns = {key: results[key][first:last].tolist() for key in column_names}
+    bait_gene_offsets = (gene_offsets[first:last + 1] - gene_offsets[first]).tolist()
+    gene_rows = results['gene_rows'][gene_offsets[first]:gene_offsets[last]].tolist()
 
     enriched_domains = []
-    for domain, adj_pvalue in sort_dict_by_value(adj_pvalues).items():
-      if adj_pvalue == 0 or adj_pvalue < corrected_fdr[domain]:
-        enriched_domains.append({
-          'domain': domain,
-          'no_genes_with_domain': len(bait_data[domain]['preys']),
-          'no_genes': preys_in_database,
-          'background_size_w_domain': stats[domain]['background_size_w_domain'],
-          'background_size': background_size,
-          'fold_enrichment': stats[domain]['fold_enrichment'],
-          'pvalue': stats[domain]['pvalue'],
-          'adj_pvalue': adj_pvalue,
-          'bh_fdr': corrected_fdr[domain],
-          'genes': bait_data[domain]['preys'],
-        })
-    
-    return enriched_domains
-
-  for bait, bait_data in domains_by_bait.items():
-    enriched_domains_by_bait[bait] = perform_domain_enrichment(bait_data['domain'], bait_data['preysInDatabase'])
-
-  return enriched_domains_by_bait
-
-def sort_dict_by_value(dict):
-  return {k: v for k, v in sorted(dict.items(), key=lambda item: item[1])}
+    for index in range(last - first):
+      enriched_domains.append({
+        'domain': domain_names[columns['domain'][index]],
+        'no_genes_with_domain': columns['prey_count'][index],
+        'no_genes': int(preys_in_database[bait_index]),
+        'background_size_w_domain': columns['background_size_w_domain'][index],
+        'background_size': background_size,
+        'fold_enrichment': columns['fold_enrichment'][index],
+        'pvalue': columns['pvalue'][index],
+        'adj_pvalue': columns['adj_pvalue'][index],
+        'bh_fdr': columns['bh_fdr'][index],
+        **({'rank_sum_pvalue': columns['rank_sum_pvalue'][index]} if 'rank_sum_pvalue' in columns else {}),
+        'genes': [prey_lookup[gene_ids[row]] for row in gene_rows[bait_gene_offsets[index]:bait_gene_offsets[index + 1]]],
+      })
+    yield baits[bait_index], enriched_domains
 
 def fishers_test(n11, n1p, np1, npp):
   '''
@@ -259,68 +823,199 @@ def fishers_test(n11, n1p, np1, npp):
   without_term  n21   n22                 | n2p
                 ---------------------------
                 np1   np2                   npp
+
+  The one-sided (greater) Fisher's exact p-value is the probability of drawing
+  at least n11 genes with the term, i.e. the hypergeometric survival function
+  evaluated at n11 - 1. Arguments can be scalars or arrays of equal length, so
+  any number of tables can be tested in one call.
   '''
-  n12 = n1p - n11
-  n21 = np1 - n11
-  n22 = npp - n1p - n21
-  _, pvalue = stats.fisher_exact([[n11, n12], [n21, n22]], 'greater')
-  return pvalue
+  return stats.hypergeom.sf(np.asarray(n11) - 1, npp, np1, n1p)
+
+def create_pvalue_cache():
+  '''
+  Cache of Fisher's test p-values keyed by the (n11, n1p, np1, npp) table margins,
+  with counts of tests answered from the cache (hits) and evaluated (misses).
+  '''
+  return {
+    'hits': 0,
+    'misses': 0,
+    'pvalues': {},
+  }
+
+def cached_fishers_test(n11, n1p, np1, npp, pvalue_cache):
+  '''
+  fishers_test for arrays of tables, evaluating each distinct table that is
+  not already in the cache only once.
+  '''
+  tables = np.stack(np.broadcast_arrays(n11, n1p, np1, npp), axis=1).astype(np.int64)
+  if len(tables) == 0:
+    return np.empty(0)
+
+  unique_tables, inverse = np.unique(tables, axis=0, return_inverse=True)
+  keys = [tuple(table) for table in unique_tables.tolist()]
+
+  cached_pvalues = pvalue_cache['pvalues']
+  missing = [index for index, key in enumerate(keys) if key not in cached_pvalues]
+  if missing:
+    missing_tables = unique_tables[missing]
+    pvalues = fishers_test(missing_tables[:, 0], missing_tables[:, 1], missing_tables[:, 2], missing_tables[:, 3])
+    for index, pvalue in zip(missing, pvalues.tolist()):
+      cached_pvalues[keys[index]] = pvalue
+
+  pvalue_cache['misses'] += len(missing)
+  pvalue_cache['hits'] += len(tables) - len(missing)
+
+  return np.array([cached_pvalues[key] for key in keys])[inverse.ravel()]
+
+def rank_sum_test(rank_sums, n1, n, tie_correction):
+  '''
+  One-sided Wilcoxon rank-sum (Mann-Whitney U) test of whether n1 values with
+  the given rank sum are greater than the other n - n1 values they were ranked
+  with. Uses the normal approximation with tie and continuity corrections.
+  Arguments are arrays, one element per test. Tests where there is nothing
+  to compare against get a p-value of 1.
+  '''
+  rank_sums = np.asarray(rank_sums, dtype=float)
+  n1 = np.asarray(n1, dtype=float)
+  n = np.asarray(n, dtype=float)
+  n2 = n - n1
+
+  u = rank_sums - n1 * (n1 + 1) / 2
+  mean = n1 * n2 / 2
+  with np.errstate(divide='ignore', invalid='ignore'):
+    variance = n1 * n2 / 12 * ((n + 1) - tie_correction / (n * (n - 1)))
+    z = (u - mean - 0.5) / np.sqrt(variance)
+
+  pvalues = stats.norm.sf(z)
+  pvalues[~(variance > 0) | ~(n2 > 0)] = 1
+  return pvalues
 
 def bh_correction(pvalues, fdr):
-	# order p-values
-  sorted_pvalues = sort_dict_by_value(pvalues)
-
-  # determine rank/order for each key
-  last_pvalue = -1
-  rank = 0
-  ranks = {}
-  for key, pvalue in sorted_pvalues.items():
-    if pvalue > last_pvalue :
-      rank += 1
-    ranks[key] = rank
-    last_pvalue = pvalue
-
-  # calculate adjusted p-values and fdr for each key
-  no_tests = len(sorted_pvalues)
-  adjusted_pvalues = {}
-  corrected_fdr = {}
-  last_adjusted = 1
-  for key in reversed(list(sorted_pvalues.keys())):
-    pvalue = sorted_pvalues[key]
-
-    adj_pvalue = pvalue * no_tests / ranks[key]
-    adj_pvalue = min(adj_pvalue, 1)
-    if last_adjusted < adj_pvalue:
-      adj_pvalue = last_adjusted
-    last_adjusted = adj_pvalue
-    adjusted_pvalues[key] = adj_pvalue
-    corrected_fdr[key] = fdr * ranks[key] / no_tests
+  '''
+  Benjamini-Hochberg correction for a dict of p-values. Returns dicts of
+  adjusted p-values and corrected FDR thresholds, ordered from the largest
+  to the smallest p-value.
+  '''
+  keys = list(pvalues.keys())
+  adj_pvalues, corrected_fdr = bh_correction_by_group(list(pvalues.values()), [0, len(keys)], fdr)
+
+  order = np.lexsort((np.arange(len(keys)), list(pvalues.values())))[::-1]
+  adjusted_pvalues = {keys[index]: float(adj_pvalues[index]) for index in order}
+  corrected_fdr = {keys[index]: float(corrected_fdr[index]) for index in order}
 
   return adjusted_pvalues, corrected_fdr
 
-def write_enriched_domains(options, enriched_domains_by_bait):
+def bh_correction_by_group(pvalues, offsets, fdr):
+  '''
+  Benjamini-Hochberg correction of an array of p-values holding several
+  independent groups of tests, with group i occupying pvalues[offsets[i]:offsets[i + 1]].
+  Tied p-values share a rank, and ranks are dense, i.e. the p-value after
+  a tie gets the next rank. Adjusted p-values are capped at 1 and made monotonic
+  with a reversed cumulative minimum in each group. Returns arrays of adjusted
+  p-values and corrected FDR thresholds aligned with the input.
+  '''
+  pvalues = np.asarray(pvalues, dtype=float)
+  offsets = np.asarray(offsets, dtype=np.int64)
+  no_values = len(pvalues)
+  if no_values == 0:
+    return np.empty(0), np.empty(0)
+
+  sizes = np.diff(offsets)
+  groups = np.repeat(np.arange(len(sizes)), sizes)
+  group_starts = np.repeat(offsets[:-1], sizes)
+  no_tests = np.repeat(sizes, sizes)
+
+  # order p-values within each group
+  order = np.lexsort((pvalues, groups))
+  sorted_pvalues = pvalues[order]
+
+  # dense rank for each p-value within its group
+  is_new_rank = np.ones(no_values, dtype=np.int64)
+  is_new_rank[1:] = (sorted_pvalues[1:] > sorted_pvalues[:-1]) | (groups[1:] != groups[:-1])
+  rank_counter = np.cumsum(is_new_rank)
+  ranks = rank_counter - rank_counter[group_starts] + 1
+
+  adjusted = np.minimum(sorted_pvalues * no_tests / ranks, 1)
+
+  # Reversed cumulative minimum within groups. Values are replaced by their
+  # integer order so groups can be separated by an offset without losing precision.
+  value_order = np.argsort(adjusted, kind='stable')
+  value_ranks = np.empty(no_values, dtype=np.int64)
+  value_ranks[value_order] = np.arange(no_values)
+  separated = value_ranks + groups * no_values
+  cumulative_min = np.minimum.accumulate(separated[::-1])[::-1] - groups * no_values
+  adjusted = adjusted[value_order][cumulative_min]
+
+  adj_pvalues = np.empty(no_values)
+  adj_pvalues[order] = adjusted
+  corrected_fdr = np.empty(no_values)
+  corrected_fdr[order] = fdr * ranks / no_tests
+
+  return adj_pvalues, corrected_fdr
+
+ENRICHMENT_COLUMNS = [
+  'domain',
+  'no_genes_with_domain',
+  'no_genes',
+  'background_size_w_domain',
+  'background_size',
+  'fold_enrichment',
+  'pvalue',
+  'adj_pvalue',
+  'bh_fdr',
+  'genes',
+]
+
+def write_enriched_domains(options, settings, enriched_domains_by_setting):
+  '''
+  Write enriched domains with a row per bait and enriched domain. When several FDR/top
+  prey settings were compared, the rows for every setting are written to one table
+  with "fdr" and "top_preys" columns. Results are consumed as they are generated,
+  (setting, iterable of (bait, enriched domains)), and streamed to a write-only
+  workbook, so they are never all held in memory.
+  '''
   saintfile = options.saint
-  top_preys = options.top_preys
 
   basename = os.path.basename(saintfile)
   filename = os.path.splitext(basename)[0]
 
-  outfile = f'domain-enrichment-{filename}.xlsx'
-  if top_preys > 0:
-    outfile = f'domain-enrichment-top{top_preys}-{filename}.xlsx'
-
-  domains = []
-
-  for bait, bait_data in enriched_domains_by_bait.items():
-    for domain in bait_data:
-      domains.append({
-        'bait': bait,
-        **domain,
-      })
-
-  # pylint: disable=abstract-class-instantiated
-  with pd.ExcelWriter(outfile) as writer:
-    pd.DataFrame(domains).to_excel(writer, index=False, sheet_name='domains')
+  is_sweep = len(settings) > 1
+  if is_sweep:
+    outfile = f'domain-enrichment-sweep-{filename}.xlsx'
+  else:
+    top_preys = settings[0].top_preys
+    outfile = f'domain-enrichment-{filename}.xlsx'
+    if top_preys > 0:
+      outfile = f'domain-enrichment-top{top_preys}-{filename}.xlsx'
+
+  setting_columns = ['fdr', 'top_preys'] if is_sweep else []
+  enrichment_columns = ENRICHMENT_COLUMNS[:-1]
+  if options.weight != 'none':
+    enrichment_columns = [*enrichment_columns, 'rank_sum_pvalue']
+
+  workbook = Workbook(write_only=True)
+  worksheet = workbook.create_sheet('domains')
+  worksheet.append([*setting_columns, 'bait', *enrichment_columns, 'genes'])
+
+  for setting, enriched_domains_by_bait in enriched_domains_by_setting:
+    setting_values = [setting.fdr, setting.top_preys] if is_sweep else []
+    for bait, enriched_domains in enriched_domains_by_bait:
+      for domain in enriched_domains:
+        worksheet.append([
+          *setting_values,
+          bait,
+          *[domain[column] for column in enrichment_columns],
+          str(domain['genes']),
+        ])
+
+  workbook.save(outfile)
+
+def build_index_command():
+  options = parse_build_index_args(sys.argv[2:])
+  build_index(options.domains, options.genemap, options.index)
 
 if __name__ == "__main__":
-  enrich()
\ No newline at end of file
+  if sys.argv[1:2] == ['build-index']:
+    build_index_command()
+  else:
+    enrich()
\ No newline at end of file
@@ -1,20 +1,41 @@
+import argparse
+import json
+import numpy as np
+import os
 import pandas as pd
 import pandas.testing as pd_testing
 import pyfakefs.fake_filesystem_unittest
+import scipy.sparse as sparse
+import tempfile
 import unittest
 
 from .main import (
   bh_correction,
+  bh_correction_by_group,
+  build_index,
+  cached_fishers_test,
   calculate_enrichment,
   count_domains_by_bait,
+  create_domain_matrix,
+  create_domain_matrix_from_index,
+  create_pvalue_cache,
   filter_saint,
   fishers_test,
   get_background,
+  get_settings,
+  is_index_current,
   map_file_ids,
   parse_domains,
+  rank_domain_values,
+  rank_sum_test,
+  read_domain_genes_from_index,
   read_domains,
   read_gene_map,
+  read_gene_map_from_index,
+  read_index,
   read_saint,
+  split_baits,
+  write_enriched_domains,
 )
 
 class ReadDomains(pyfakefs.fake_filesystem_unittest.TestCase):
@@ -277,6 +298,17 @@ class FilterSaint(pyfakefs.fake_filesystem_unittest.TestCase):
 
     self.assertEqual(filter_saint(options, saint), expected)
 
+class GetSettings(unittest.TestCase):
+  def test(self):
+    class Options:
+      fdr = [0.01, 0.05]
+      top_preys = [0, 10]
+
+    expected = [(0.01, 0), (0.01, 10), (0.05, 0), (0.05, 10)]
+
+    actual = [(setting.fdr, setting.top_preys) for setting in get_settings(Options())]
+    self.assertListEqual(actual, expected)
+
 class GetBackground(pyfakefs.fake_filesystem_unittest.TestCase):
   def get_test_options(self, arg_background):
     domains = {
@@ -386,17 +418,8 @@ class ReadSequenceElements(pyfakefs.fake_filesystem_unittest.TestCase):
     self.assertEqual(acutal_ids_by_domain, expected_ids_by_domain)
     self.assertEqual(acutal_domains_by_id, expected_domains_by_id)
 
-class CountDomainsByBait(unittest.TestCase):
+class CreateDomainMatrix(unittest.TestCase):
   def test(self):
-    saint = pd.DataFrame([
-      { 'Bait': 'AAA', 'Prey': '1', 'PreyGene': 'prey1', 'AvgSpec': 10, 'BFDR': 0.01 },
-      { 'Bait': 'AAA', 'Prey': '2', 'PreyGene': 'prey2', 'AvgSpec': 20, 'BFDR': 0 },
-      { 'Bait': 'AAA', 'Prey': '3', 'PreyGene': 'prey3', 'AvgSpec': 15, 'BFDR': 0.01 },
-      { 'Bait': 'AAA', 'Prey': '5', 'PreyGene': 'prey5', 'AvgSpec': 25, 'BFDR': 0.01 },
-      { 'Bait': 'AAA', 'Prey': '6', 'PreyGene': 'prey6', 'AvgSpec': 40, 'BFDR': 0.01 },
-      { 'Bait': 'BBB', 'Prey': '2', 'PreyGene': 'prey2', 'AvgSpec': 20, 'BFDR': 0.01 },
-      { 'Bait': 'BBB', 'Prey': 'NP_77777', 'PreyGene': 'prey7', 'AvgSpec': 30, 'BFDR': 0.01 },
-    ])
     domains_by_id = {
       '1': {
         'dA': { 'count': 2, 'length': 24 },
@@ -414,51 +437,142 @@ class CountDomainsByBait(unittest.TestCase):
         'dE': { 'count': 1, 'length': 6 },
       },
     }
+    ids_by_domain = {
+      'dA': ['1', '3'],
+      'dB': ['1'],
+      'dC': ['2'],
+      'dD': ['3', '5'],
+      'dE': ['5'],
+    }
 
-    expected = {
-      'AAA': {
-        'preysInDatabase': 4,
-        'domain': {
-          'dA': {
-            'countByAccession': [2, 1],
-            'lengthByAccession': [24, 12],
-            'preys': ['prey1', 'prey3'],
-          },
-          'dB': {
-            'countByAccession': [1],
-            'lengthByAccession': [16],
-            'preys': ['prey1'],
-          },
-          'dC': {
-            'countByAccession': [1],
-            'lengthByAccession': [21],
-            'preys': ['prey2'],
-          },
-          'dD': {
-            'countByAccession': [1, 1],
-            'lengthByAccession': [31, 31],
-            'preys': ['prey3', 'prey5'],
-          },
-          'dE': {
-            'countByAccession': [1],
-            'lengthByAccession': [6],
-            'preys': ['prey5'],
-          },
-        },
-      },
-      'BBB': {
-        'preysInDatabase': 1,
-        'domain': {
-          'dC': {
-            'countByAccession': [1],
-            'lengthByAccession': [21],
-            'preys': ['prey2'],
-          },
-        }
-      },
+    actual = create_domain_matrix(domains_by_id, ids_by_domain)
+
+    self.assertListEqual(actual['genes'], ['1', '2', '3', '5'])
+    self.assertListEqual(actual['domains'], ['dA', 'dB', 'dC', 'dD', 'dE'])
+    self.assertEqual(actual['gene_index'], { '1': 0, '2': 1, '3': 2, '5': 3 })
+    self.assertListEqual(actual['background_counts'].tolist(), [2, 1, 1, 2, 1])
+    self.assertListEqual(actual['incidence'].toarray().tolist(), [
+      [1, 1, 0, 0, 0],
+      [0, 0, 1, 0, 0],
+      [1, 0, 0, 1, 0],
+      [0, 0, 0, 1, 1],
+    ])
+    self.assertListEqual(actual['counts'].toarray().tolist(), [
+      [2, 1, 0, 0, 0],
+      [0, 0, 1, 0, 0],
+      [1, 0, 0, 1, 0],
+      [0, 0, 0, 1, 1],
+    ])
+    self.assertListEqual(actual['lengths'].toarray().tolist(), [
+      [24, 16, 0, 0, 0],
+      [0, 0, 21, 0, 0],
+      [12, 0, 0, 31, 0],
+      [0, 0, 0, 31, 6],
+    ])
+
+class CountDomainsByBait(unittest.TestCase):
+  def test(self):
+    saint = pd.DataFrame([
+      { 'Bait': 'AAA', 'Prey': '1', 'PreyGene': 'prey1', 'AvgSpec': 10, 'BFDR': 0.01 },
+      { 'Bait': 'AAA', 'Prey': '2', 'PreyGene': 'prey2', 'AvgSpec': 20, 'BFDR': 0 },
+      { 'Bait': 'AAA', 'Prey': '3', 'PreyGene': 'prey3', 'AvgSpec': 15, 'BFDR': 0.01 },
+      { 'Bait': 'AAA', 'Prey': '5', 'PreyGene': 'prey5', 'AvgSpec': 25, 'BFDR': 0.01 },
+      { 'Bait': 'AAA', 'Prey': '6', 'PreyGene': 'prey6', 'AvgSpec': 40, 'BFDR': 0.01 },
+      { 'Bait': 'BBB', 'Prey': '2', 'PreyGene': 'prey2', 'AvgSpec': 20, 'BFDR': 0.01 },
+      { 'Bait': 'BBB', 'Prey': 'NP_77777', 'PreyGene': 'prey7', 'AvgSpec': 30, 'BFDR': 0.01 },
+    ])
+    domain_matrix = {
+      'domains': ['dA', 'dB', 'dC', 'dD', 'dE'],
+      'gene_index': { '1': 0, '2': 1, '3': 2, '5': 3 },
+      'genes': ['1', '2', '3', '5'],
+      'incidence': sparse.csr_matrix(np.array([
+        [1, 1, 0, 0, 0],
+        [0, 0, 1, 0, 0],
+        [1, 0, 0, 1, 0],
+        [0, 0, 0, 1, 1],
+      ])),
+    }
+
+    actual = count_domains_by_bait(saint, domain_matrix)
+
+    self.assertListEqual(actual['baits'], ['AAA', 'BBB'])
+    self.assertListEqual(actual['domain_counts'].toarray().tolist(), [
+      [2, 1, 1, 2, 1],
+      [0, 0, 1, 0, 0],
+    ])
+    self.assertListEqual([preys.tolist() for preys in actual['preys_by_bait']], [[0, 1, 2, 3], [1]])
+    self.assertListEqual(actual['preys_in_database'].tolist(), [4, 1])
+    self.assertEqual(actual['prey_lookup']['3'], 'prey3')
+    self.assertNotIn('rank_sums', actual)
+
+  def test_rank_sums(self):
+    saint = pd.DataFrame([
+      { 'Bait': 'AAA', 'Prey': '1', 'PreyGene': 'prey1', 'AvgSpec': 10, 'BFDR': 0.01 },
+      { 'Bait': 'AAA', 'Prey': '3', 'PreyGene': 'prey3', 'AvgSpec': 15, 'BFDR': 0.01 },
+      { 'Bait': 'BBB', 'Prey': '5', 'PreyGene': 'prey5', 'AvgSpec': 25, 'BFDR': 0.01 },
+    ])
+    domain_matrix = {
+      'genes': ['1', '2', '3', '5'],
+      'gene_index': { '1': 0, '2': 1, '3': 2, '5': 3 },
+      'incidence': sparse.csr_matrix(np.array([
+        [1, 1],
+        [1, 0],
+        [0, 1],
+        [1, 1],
+      ])),
+    }
+    domain_ranks = {
+      'ranks': sparse.csr_matrix(np.array([
+        [3, 1],
+        [1.5, 0],
+        [0, 2],
+        [1.5, 3],
+      ])),
+      'tie_correction': np.array([6, 0]),
     }
 
-    self.assertEqual(count_domains_by_bait(saint, domains_by_id), expected)
+    actual = count_domains_by_bait(saint, domain_matrix, domain_ranks)
+    self.assertListEqual(actual['rank_sums'].toarray().tolist(), [[3, 3], [1.5, 3]])
+    self.assertListEqual(actual['rank_tie_correction'].tolist(), [6, 0])
+
+class RankDomainValues(unittest.TestCase):
+  def test(self):
+    values = sparse.csr_matrix(np.array([
+      [2, 16, 0],
+      [0, 0, 21],
+      [1, 0, 0],
+      [1, 31, 0],
+      [3, 0, 0],
+    ]))
+
+    expected_ranks = [
+      [3, 1, 0],
+      [0, 0, 1],
+      [1.5, 0, 0],
+      [1.5, 2, 0],
+      [4, 0, 0],
+    ]
+    expected_tie_correction = [6, 0, 0]
+
+    actual = rank_domain_values(values)
+    self.assertListEqual(actual['ranks'].toarray().tolist(), expected_ranks)
+    self.assertListEqual(actual['tie_correction'].tolist(), expected_tie_correction)
+
+class RankSumTest(unittest.TestCase):
+  def test(self):
+    # 1: values [5, 6, 7] vs [1, 2, 3, 3], ranks 5, 6 and 7 with one tie of size 2
+    # 2: value 3 vs [1, 2, 4], rank 3
+    # 3: nothing to compare against
+    rank_sums = [18, 3, 3]
+    n1 = [3, 1, 2]
+    n = [7, 4, 2]
+    tie_correction = [6, 0, 0]
+
+    expected = [0.024872995360751497, 0.5, 1]
+
+    actual = rank_sum_test(rank_sums, n1, n, tie_correction)
+    for actual_pvalue, expected_pvalue in zip(actual, expected):
+      self.assertAlmostEqual(actual_pvalue, expected_pvalue, places=12)
 
 class FishersTest(unittest.TestCase):
   def test(self):
@@ -471,6 +585,37 @@ class FishersTest(unittest.TestCase):
 
     self.assertAlmostEqual(fishers_test(n11, n1p, np1, npp), expected, places=5)
 
+  def test_arrays(self):
+    n11 = [10, 2, 1]
+    n1p = [15, 3, 2]
+    np1 = [15, 4, 1]
+    npp = [100, 1000, 1000]
+
+    expected = [4e-7, 3.5987891699293464e-05, 0.002]
+
+    actual = fishers_test(n11, n1p, np1, npp)
+    self.assertEqual(len(actual), len(expected))
+    for actual_pvalue, expected_pvalue in zip(actual, expected):
+      self.assertAlmostEqual(actual_pvalue, expected_pvalue, places=5)
+
+class CachedFishersTest(unittest.TestCase):
+  def test(self):
+    n11 = [10, 2, 10, 1]
+    n1p = [15, 3, 15, 2]
+    np1 = [15, 4, 15, 1]
+    npp = 100
+
+    pvalue_cache = create_pvalue_cache()
+    expected = fishers_test(n11, n1p, np1, npp).tolist()
+
+    self.assertListEqual(cached_fishers_test(n11, n1p, np1, npp, pvalue_cache).tolist(), expected)
+    self.assertEqual(pvalue_cache['hits'], 1)
+    self.assertEqual(pvalue_cache['misses'], 3)
+
+    self.assertListEqual(cached_fishers_test(n11, n1p, np1, npp, pvalue_cache).tolist(), expected)
+    self.assertEqual(pvalue_cache['hits'], 5)
+    self.assertEqual(pvalue_cache['misses'], 3)
+
 class BhCorrection(unittest.TestCase):
   def test(self):
     fdr = 0.01
@@ -501,45 +646,57 @@ class BhCorrection(unittest.TestCase):
     self.assertEqual(actual_adj_pvalues, expected_adj_pvalues)
     self.assertEqual(actual_corrected_fdr, expected_corrected_fdr)
 
-class CalculateEnrichment(unittest.TestCase):
+class BhCorrectionByGroup(unittest.TestCase):
   def test(self):
+    fdr = 0.01
+    pvalues = [0.01, 0.00001, 0.001, 0.0001, 0.001, 0.04, 0.02, 0.03]
+    offsets = [0, 5, 5, 8]
+
+    expected_adj_pvalues = [0.0125, 0.00005, 0.0016666666666666668, 0.00025, 0.0016666666666666668, 0.04, 0.04, 0.04]
+    expected_corrected_fdr = [0.008, 0.002, 0.006, 0.004, 0.006, 0.01, 0.0033333333333333335, 0.006666666666666667]
+
+    actual_adj_pvalues, actual_corrected_fdr = bh_correction_by_group(pvalues, offsets, fdr)
+    self.assertListEqual(actual_adj_pvalues.tolist(), expected_adj_pvalues)
+    self.assertListEqual(actual_corrected_fdr.tolist(), expected_corrected_fdr)
+
+class CalculateEnrichment(unittest.TestCase):
+  def assertEnrichmentEqual(self, actual, expected):
+    float_fields = ['fold_enrichment', 'pvalue', 'adj_pvalue', 'bh_fdr']
+    self.assertEqual(list(actual.keys()), list(expected.keys()))
+    for bait, expected_domains in expected.items():
+      self.assertEqual(len(actual[bait]), len(expected_domains))
+      for actual_domain, expected_domain in zip(actual[bait], expected_domains):
+        self.assertEqual(list(actual_domain.keys()), list(expected_domain.keys()))
+        for field, value in expected_domain.items():
+          if field in float_fields:
+            self.assertAlmostEqual(actual_domain[field], value, places=12)
+          else:
+            self.assertEqual(actual_domain[field], value)
+
+  def get_test_data(self):
     background_size = 1000
     fdr = 0.01
-    domains_by_bait = {
-      'AAA': {
-        'preysInDatabase': 3,
-        'domain': {
-          'dA': {
-            'countByAccession': [1, 2],
-            'lengthByAccession': [12, 31],
-            'preys': ['prey1', 'prey3'],
-          },
-          'dB': {
-            'countByAccession': [1],
-            'lengthByAccession': [11],
-            'preys': ['prey3'],
-          },
-        },
-      },
-      'BBB': {
-        'preysInDatabase': 2,
-        'domain': {
-          'dA': {
-            'countByAccession': [2],
-            'lengthByAccession': [31],
-            'preys': ['prey3'],
-          },
-          'dB': {
-            'countByAccession': [1],
-            'lengthByAccession': [11],
-            'preys': ['prey3'],
-          },
-        },
-      },
+    domain_matrix = {
+      'background_counts': np.array([4, 1]),
+      'domains': ['dA', 'dB'],
+      'genes': ['1', '3', '4', '5', '6'],
+      'incidence': sparse.csr_matrix(np.array([
+        [1, 0],
+        [1, 1],
+        [1, 0],
+        [1, 0],
+        [0, 0],
+      ])),
     }
-    ids_by_domain = {
-      'dA': ['1', '3', '4', '5'],
-      'dB': ['3'],
+    domains_by_bait = {
+      'baits': ['AAA', 'BBB'],
+      'domain_counts': sparse.csr_matrix(np.array([
+        [2, 1],
+        [1, 1],
+      ])),
+      'prey_lookup': { '1': 'prey1', '3': 'prey3', '6': 'prey6' },
+      'preys_by_bait': [np.array([0, 1, 4]), np.array([1, 4])],
+      'preys_in_database': np.array([3, 2]),
     }
   
     expected = {
@@ -597,6 +754,246 @@ class CalculateEnrichment(unittest.TestCase):
       ],
     }
     
-    actual = calculate_enrichment(domains_by_bait, ids_by_domain, background_size, fdr)
-    self.assertEqual(actual, expected)
-    
\ No newline at end of file
+    return domains_by_bait, domain_matrix, background_size, fdr, expected
+
+  def test(self):
+    domains_by_bait, domain_matrix, background_size, fdr, expected = self.get_test_data()
+    actual = calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr)
+    self.assertEnrichmentEqual(actual, expected)
+
+  def test_workers(self):
+    domains_by_bait, domain_matrix, background_size, fdr, expected = self.get_test_data()
+    actual = calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers=2)
+    self.assertEnrichmentEqual(actual, expected)
+
+  def test_workers_pvalue_cache(self):
+    domains_by_bait, domain_matrix, background_size, fdr, _ = self.get_test_data()
+    expected_cache = create_pvalue_cache()
+    calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, pvalue_cache=expected_cache)
+
+    pvalue_cache = create_pvalue_cache()
+    calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers=2, pvalue_cache=pvalue_cache)
+    self.assertEqual(pvalue_cache['pvalues'], expected_cache['pvalues'])
+    self.assertEqual(pvalue_cache['misses'], 4)
+
+    calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers=2, pvalue_cache=pvalue_cache)
+    self.assertEqual(pvalue_cache['hits'], 4)
+    self.assertEqual(pvalue_cache['misses'], 4)
+
+  def test_rank_sums_without_tests(self):
+    saint = pd.DataFrame(columns=['Bait', 'Prey', 'PreyGene', 'AvgSpec', 'BFDR'])
+    _, domain_matrix, background_size, fdr, _ = self.get_test_data()
+    domain_matrix['gene_index'] = { '1': 0, '3': 1, '4': 2, '5': 3, '6': 4 }
+    domain_ranks = rank_domain_values(domain_matrix['incidence'])
+    domains_by_bait = count_domains_by_bait(saint, domain_matrix, domain_ranks)
+
+    actual = calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr)
+    self.assertEqual(actual, {})
+
+  def test_rank_sums_workers_shard_without_tests(self):
+    domains_by_bait, domain_matrix, background_size, fdr, _ = self.get_test_data()
+    domains_by_bait['baits'].append('CCC')
+    domains_by_bait['domain_counts'] = sparse.csr_matrix(np.array([
+      [2, 1],
+      [1, 1],
+      [0, 0],
+    ]))
+    domains_by_bait['preys_by_bait'].append(np.array([4]))
+    domains_by_bait['preys_in_database'] = np.array([3, 2, 1])
+    domains_by_bait['rank_sums'] = sparse.csr_matrix(np.array([
+      [3, 1],
+      [1.5, 1],
+      [0, 0],
+    ]))
+    domains_by_bait['rank_tie_correction'] = np.array([6, 0])
+
+    expected = calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr)
+    actual = calculate_enrichment(domains_by_bait, domain_matrix, background_size, fdr, workers=2)
+    self.assertEnrichmentEqual(actual, expected)
+    self.assertEqual(actual['CCC'], [])
+
+class SplitBaits(unittest.TestCase):
+  def test(self):
+    domain_counts = sparse.csr_matrix(np.array([
+      [1, 1, 1],
+      [1, 0, 0],
+      [0, 0, 0],
+      [1, 1, 0],
+      [1, 0, 1],
+    ]))
+
+    self.assertEqual(split_baits(domain_counts), [(0, 5)])
+    self.assertEqual(split_baits(domain_counts, shard_tests=2), [(0, 1), (1, 2), (2, 4), (4, 5)])
+    self.assertEqual(split_baits(domain_counts, min_shards=2), [(0, 2), (2, 5)])
+
+  def test_no_baits(self):
+    self.assertEqual(split_baits(sparse.csr_matrix((0, 2))), [])
+
+class Index(unittest.TestCase):
+  def setUp(self):
+    self.tempdir = tempfile.TemporaryDirectory()
+    self.addCleanup(self.tempdir.cleanup)
+
+    self.domains = {
+      '1': [
+        { 'name': 'dA', 'start': 10, 'end': 21 },
+        { 'name': 'dB', 'start': 30, 'end': 45 },
+        { 'name': 'dA', 'start': 50, 'end': 61 },
+      ],
+      '2': [
+        { 'name': 'dC', 'start': 15, 'end': 35 },
+      ],
+      '3': [
+        { 'name': 'dA', 'start': 20, 'end': 31 },
+        { 'name': 'dD', 'start': 35, 'end': 65 },
+      ],
+      '5': [
+        { 'name': 'dD', 'start': 10, 'end': 40 },
+        { 'name': 'dE', 'start': 50, 'end': 55 },
+      ],
+      '6': [
+        { 'name': 'dF', 'start': 30, 'end': 45 },
+        { 'name': 'dA', 'start': 60, 'end': 71 },
+      ],
+    }
+    genemap = {
+      '1': { 'entrez': '11', 'refseqp': ['NP_11111'] },
+      '2': { 'entrez': '22', 'refseqp': ['NP_22222', 'NP_02222'] },
+      '3': { 'entrez': '33', 'refseqp': ['NP_33333'] },
+      '4': { 'entrez': '44', 'refseqp': ['NP_44444'] },
+      '5': { 'entrez': '55', 'refseqp': ['NP_55555'] },
+      '6': { 'entrez': '66', 'refseqp': ['NP_66666'] },
+    }
+
+    self.domainfile = os.path.join(self.tempdir.name, 'domains.json')
+    self.genemapfile = os.path.join(self.tempdir.name, 'genemap.json')
+    self.index_dir = os.path.join(self.tempdir.name, 'index')
+    with open(self.domainfile, 'w') as f:
+      json.dump(self.domains, f)
+    with open(self.genemapfile, 'w') as f:
+      json.dump(genemap, f)
+
+    build_index(self.domainfile, self.genemapfile, self.index_dir)
+    self.index = read_index(self.index_dir)
+
+  def test_domain_genes(self):
+    self.assertListEqual(read_domain_genes_from_index(self.index), ['1', '2', '3', '5', '6'])
+
+  def test_domain_matrix(self):
+    background = ['5', '1', '2', '3', '4', 'NP_77777']
+
+    expected = create_domain_matrix(*parse_domains(self.domains, background))
+    actual = create_domain_matrix_from_index(self.index, background)
+
+    self.assertListEqual(actual['genes'], expected['genes'])
+    self.assertListEqual(actual['domains'], expected['domains'])
+    self.assertEqual(actual['gene_index'], expected['gene_index'])
+    self.assertListEqual(actual['background_counts'].tolist(), expected['background_counts'].tolist())
+    for matrix in ['counts', 'incidence', 'lengths']:
+      self.assertListEqual(actual[matrix].toarray().tolist(), expected[matrix].toarray().tolist())
+
+  def test_gene_map(self):
+    ids = ['NP_02222', 'NP_44444', 'NP_77777', 'NP_66666']
+    expected = {
+      'NP_02222': '2',
+      'NP_44444': '4',
+      'NP_66666': '6',
+    }
+    self.assertEqual(read_gene_map_from_index(self.index, 'refseqp', ids), expected)
+
+    ids = ['11', '55', '77']
+    expected = {
+      '11': '1',
+      '55': '5',
+    }
+    self.assertEqual(read_gene_map_from_index(self.index, 'entrez', ids), expected)
+
+  def test_is_index_current(self):
+    self.assertTrue(is_index_current(self.index_dir, self.domainfile, self.genemapfile))
+
+    with open(self.domainfile, 'a') as f:
+      f.write('\n')
+    self.assertFalse(is_index_current(self.index_dir, self.domainfile, self.genemapfile))
+
+  def test_missing_index_is_not_current(self):
+    self.assertFalse(is_index_current(os.path.join(self.tempdir.name, 'missing'), self.domainfile, self.genemapfile))
+
+  def test_rebuild(self):
+    genes = self.index['genes'].tolist()
+    self.domains['7'] = [{ 'name': 'dA', 'start': 1, 'end': 10 }]
+    with open(self.domainfile, 'w') as f:
+      json.dump(self.domains, f)
+
+    build_index(self.domainfile, self.genemapfile, self.index_dir)
+    rebuilt = read_index(self.index_dir)
+    self.assertEqual(self.index['genes'].tolist(), genes)
+    self.assertIn(b'7', rebuilt['genes'].tolist())
+
+    # Builds only remove arrays last written before they started.
+    os.utime(os.path.join(self.index_dir, self.index['arrays']), ns=(0, 0))
+    build_index(self.domainfile, self.genemapfile, self.index_dir)
+    arrays_dirs = [name for name in os.listdir(self.index_dir) if name.startswith('arrays-')]
+    self.assertCountEqual(arrays_dirs, [rebuilt['arrays'], read_index(self.index_dir)['arrays']])
+    self.assertEqual(self.index['genes'].tolist(), genes)
+
+class WriteEnrichedDomains(pyfakefs.fake_filesystem_unittest.TestCase):
+  def setUp(self):
+    self.setUpPyfakefs()
+
+  def get_enriched_domains(self, bait, pvalue):
+    return [
+      (bait, [{
+        'domain': 'dA',
+        'no_genes_with_domain': 2,
+        'no_genes': 3,
+        'background_size_w_domain': 4,
+        'background_size': 1000,
+        'fold_enrichment': 166.66666666666666,
+        'pvalue': pvalue,
+        'adj_pvalue': pvalue * 2,
+        'bh_fdr': 0.005,
+        'genes': ['prey1', 'prey3'],
+      }]),
+      ('CCC', []),
+    ]
+
+  def test(self):
+    class Options:
+      saint = '/test/saint.txt'
+      weight = 'none'
+    settings = [argparse.Namespace(fdr=0.01, top_preys=0)]
+
+    write_enriched_domains(Options(), settings, [(settings[0], self.get_enriched_domains('AAA', 0.001))])
+
+    expected = pd.DataFrame([{
+      'bait': 'AAA',
+      'domain': 'dA',
+      'no_genes_with_domain': 2,
+      'no_genes': 3,
+      'background_size_w_domain': 4,
+      'background_size': 1000,
+      'fold_enrichment': 166.66666666666666,
+      'pvalue': 0.001,
+      'adj_pvalue': 0.002,
+      'bh_fdr': 0.005,
+      'genes': "['prey1', 'prey3']",
+    }])
+    pd_testing.assert_frame_equal(pd.read_excel('domain-enrichment-saint.xlsx'), expected)
+
+  def test_sweep(self):
+    class Options:
+      saint = '/test/saint.txt'
+      weight = 'none'
+    settings = [argparse.Namespace(fdr=0.01, top_preys=0), argparse.Namespace(fdr=0.05, top_preys=10)]
+
+    write_enriched_domains(Options(), settings, [
+      (settings[0], self.get_enriched_domains('AAA', 0.001)),
+      (settings[1], self.get_enriched_domains('BBB', 0.002)),
+    ])
+
+    actual = pd.read_excel('domain-enrichment-sweep-saint.xlsx')
+    self.assertListEqual(list(actual.columns[:3]), ['fdr', 'top_preys', 'bait'])
+    self.assertListEqual(actual[['fdr', 'top_preys', 'bait', 'pvalue']].values.tolist(), [
+      [0.01, 0, 'AAA', 0.001],
+      [0.05, 10, 'BBB', 0.002],
+    ])
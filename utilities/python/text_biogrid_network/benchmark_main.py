@@ -0,0 +1,63 @@
+import random
+import timeit
+
+from .main import consolidate_symbols, extract_interaction_pairs, merge_input_interactions
+
+'''
+Usage:
+
+python3 -m text_biogrid_network.benchmark_main
+
+Times symbol consolidation for a network built from a SAINT file with 1,000 baits.
+'''
+
+NO_BAITS = 1000
+NO_GENES = 20000
+PREYS_PER_BAIT = 200
+BIOGRID_INTERACTIONS_PER_BAIT = 100
+REPEATS = 5
+
+def create_input(no_baits, no_genes, preys_per_bait):
+  rng = random.Random(0)
+  baits = [str(id) for id in rng.sample(range(no_genes), no_baits)]
+  input_ids = {bait: f'B{bait}' for bait in baits}
+  input_interactions = {
+    bait: {
+      'symbol': f'B{bait}',
+      'targets': {str(prey): { 'symbol': f'P{prey}' } for prey in rng.sample(range(no_genes), preys_per_bait)},
+    }
+    for bait in baits
+  }
+  return input_ids, input_interactions
+
+def create_biogrid_data(baits, no_genes, interactions_per_bait):
+  rng = random.Random(1)
+  return [
+    {
+      'ENTREZ_GENE_A': bait,
+      'ENTREZ_GENE_B': str(target),
+      'OFFICIAL_SYMBOL_A': f'S{bait}',
+      'OFFICIAL_SYMBOL_B': f'S{target}',
+    }
+    for bait in baits
+    for target in rng.sample(range(no_genes), interactions_per_bait)
+  ]
+
+def benchmark():
+  input_ids, input_interactions = create_input(NO_BAITS, NO_GENES, PREYS_PER_BAIT)
+  biogrid_data = create_biogrid_data(list(input_ids.keys()), NO_GENES, BIOGRID_INTERACTIONS_PER_BAIT)
+
+  def consolidate():
+    graph = extract_interaction_pairs(biogrid_data, input_ids)
+    graph = merge_input_interactions(graph, input_interactions)
+    return graph, timeit.timeit(lambda: consolidate_symbols('symbol', graph, input_ids, input_interactions), number=1)
+
+  seconds = min(consolidate()[1] for _ in range(REPEATS))
+  print(
+    f'consolidate_symbols: {NO_BAITS} baits, {NO_BAITS * PREYS_PER_BAIT} SAINT interactions, '
+    f'{len(biogrid_data)} BioGRID interactions'
+  )
+  print(f'best of {REPEATS}: {seconds:.3f}s')
+
+if __name__ == '__main__':
+  benchmark()
@@ -1,8 +1,21 @@
+from array import array
 import argparse
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import csv
+import itertools
 import json
+import os
 import pandas as pd
 import re
 import requests
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
 
 from distutils.util import strtobool
 
@@ -15,8 +28,61 @@ python3 main.py \
 -k $access_key
 
 output: biogrid-interactions.txt and cytoscape.txt
+
+Instead of querying the BioGRID web service, interactions can be read from a
+local database built from a BioGRID TAB3 release, in which case no access key is
+needed:
+
+python3 main.py build-db \
+-t BIOGRID-ALL.tab3.txt \
+-db biogrid.sqlite
+
+python3 main.py \
+-db biogrid.sqlite \
+-f file.txt \
+-g genemap.json
 '''
 
+# TAB3 columns stored in the local database and the equivalent web service fields.
+TAB3_FIELDS = {
+  '#BioGRID Interaction ID': 'BIOGRID_INTERACTION_ID',
+  'Entrez Gene Interactor A': 'ENTREZ_GENE_A',
+  'Entrez Gene Interactor B': 'ENTREZ_GENE_B',
+  'BioGRID ID Interactor A': 'BIOGRID_ID_A',
+  'BioGRID ID Interactor B': 'BIOGRID_ID_B',
+  'Systematic Name Interactor A': 'SYSTEMATIC_NAME_A',
+  'Systematic Name Interactor B': 'SYSTEMATIC_NAME_B',
+  'Official Symbol Interactor A': 'OFFICIAL_SYMBOL_A',
+  'Official Symbol Interactor B': 'OFFICIAL_SYMBOL_B',
+  'Synonyms Interactor A': 'SYNONYMS_A',
+  'Synonyms Interactor B': 'SYNONYMS_B',
+  'Experimental System': 'EXPERIMENTAL_SYSTEM',
+  'Experimental System Type': 'EXPERIMENTAL_SYSTEM_TYPE',
+  'Author': 'PUBMED_AUTHOR',
+  'Publication Source': 'PUBMED_ID',
+  'Organism ID Interactor A': 'ORGANISM_A',
+  'Organism ID Interactor B': 'ORGANISM_B',
+  'Throughput': 'THROUGHPUT',
+  'Score': 'QUANTITATION',
+  'Modification': 'MODIFICATION',
+  'Qualifications': 'QUALIFICATIONS',
+  'Tags': 'TAGS',
+  'Source Database': 'SOURCEDB',
+}
+TAB3_INTEGER_FIELDS = ['BIOGRID_INTERACTION_ID', 'ORGANISM_A', 'ORGANISM_B']
+
+BIOGRID_URL = 'https://webservice.thebiogrid.org/interactions/'
+# Maximum number of interactions BioGRID returns per request.
+BIOGRID_PAGE_SIZE = 10000
+# Interaction fields kept in memory once written to biogrid-interactions.txt.
+PAIR_FIELDS = ['ENTREZ_GENE_A', 'ENTREZ_GENE_B', 'OFFICIAL_SYMBOL_A', 'OFFICIAL_SYMBOL_B']
+# Fraction of the cache size limit that eviction trims the cache down to.
+CACHE_EVICTION_TARGET = 0.8
+
+# Edge flags in interaction graphs.
+ISPREY = 1
+KNOWN = 2
+
 def get_interactions():
   options = parse_args()
 
@@ -25,8 +91,15 @@ def get_interactions():
   mapped_ids, mapped_interactions = map_identifiers(ids, input_interactions, id_map)
 
   post_data = create_post_data(options, mapped_ids.keys())
-  biogrid_data = fetch_interactions(post_data)
-  write_biogrid_data(biogrid_data)
+  if options.biogrid_db:
+    biogrid_data = query_local_interactions(options.biogrid_db, post_data)
+  elif options.local_secondary_interactions and post_data['includeInteractors'] and post_data['includeInteractorInteractions']:
+    biogrid_data = fetch_secondary_interactions_locally(post_data, options)
+  elif options.shard_size > 0 and not options.cache and is_cacheable_query(post_data):
+    biogrid_data = fetch_sharded_interactions(post_data, options)
+  else:
+    biogrid_data = fetch_cached_interactions(post_data, options)
+  biogrid_data = write_biogrid_data(biogrid_data)
 
   interactions = extract_interaction_pairs(biogrid_data, mapped_ids.keys())
   interactions = merge_input_interactions(interactions, mapped_interactions)
@@ -38,8 +111,31 @@ def parse_args():
 
   parser.add_argument(
     '--access_key', '-k',
-    help='BioGRID access key',
-    required=True,
+    help='BioGRID access key. Required unless interactions are read from a local database (biogrid_db)',
+  )
+  parser.add_argument(
+    '--biogrid_db', '-db',
+    default='',
+    help='Local BioGRID database created with build-db. If set, the BioGRID web service is not used.',
+  )
+  parser.add_argument(
+    '--cache', '-c',
+    default='',
+    help='File for caching BioGRID responses between runs. Only genes not in the cache are '
+      'fetched. Used when fetching all first order interactors of the gene list, i.e. '
+      'include_primary_interactions is true, include_secondary_interactions is false and max is 0.',
+  )
+  parser.add_argument(
+    '--cache_size', '-cs',
+    default=500,
+    help='Maximum size of the cache in MB; the oldest responses are removed when it is exceeded.',
+    type=float,
+  )
+  parser.add_argument(
+    '--cache_ttl', '-ct',
+    default=30,
+    help='Number of days cached responses are used before being fetched again.',
+    type=float,
   )
   parser.add_argument(
     '--evidence_list', '-el',
@@ -106,6 +202,14 @@ def parse_args():
     help='Is the input file a SAINT formatted file.',
     type=lambda x: bool(strtobool(str(x)))
   )
+  parser.add_argument(
+    '--local_secondary_interactions', '-lsi',
+    default=False,
+    help='If true and include_secondary_interactions is true, interactions between first order '
+      'interactors are found locally from the interactions of each interactor, which can be '
+      'cached between runs (see cache), rather than by the BioGRID service.',
+    type=lambda x: bool(strtobool(str(x)))
+  )
   parser.add_argument(
     '--genemap', '-g',
     help='A file in JSON formatting mapping HUGO gene IDs to different identifiers',
@@ -113,17 +217,33 @@ def parse_args():
   )
   parser.add_argument(
     '--max', '-m',
-    default=10000,
-    help='Number of results to fetch; this will be ignored if greater than 10,000, i.e. '
-      'pagination using several requests is required to retrieve more than 10,000 interactions.',
+    default=0,
+    help='Maximum number of results to fetch, 0 for all. BioGRID returns at most 10,000 '
+      'interactions per request, so larger results are fetched in several pages.',
     type=int
   )
+  parser.add_argument(
+    '--network_format', '-nf',
+    choices=['graphml', 'json', 'tsv'],
+    default='tsv',
+    help='Format of the network file: a table (cytoscape.txt), Cytoscape JSON (cytoscape.json) '
+      'or GraphML (cytoscape.graphml)',
+  )
   parser.add_argument(
     '--self_interactions_excluded', '-sie',
     default=True,
     help='If true, interactions with one interactor will be excluded.',
     type=lambda x: bool(strtobool(str(x)))
   )
+  parser.add_argument(
+    '--shard_size', '-ss',
+    default=0,
+    help='If greater than 0, split the gene list into shards of this many genes that are fetched '
+      'concurrently (up to workers at once) and written as they arrive. Only used when fetching all '
+      'first order interactors without a cache, i.e. include_primary_interactions is true, '
+      'include_secondary_interactions is false and max is 0.',
+    type=int,
+  )
   parser.add_argument(
     '--tax_id', '-ti',
     default='All',
@@ -137,8 +257,37 @@ def parse_args():
       'in the throughput field will be returned. Interactions with both Low throughput and '
       'High throughput will be returned by either value.',
   )
+  parser.add_argument(
+    '--workers', '-w',
+    default=4,
+    help='Number of result pages to fetch from BioGRID concurrently',
+    type=int,
+  )
 
-  return parser.parse_args()
+  options = parser.parse_args()
+  if not options.access_key and not options.biogrid_db:
+    parser.error('an access key (--access_key) or local database (--biogrid_db) is required')
+
+  return options
+
+def parse_build_db_args(args):
+  parser = argparse.ArgumentParser(
+    description='Create a local BioGRID database from a TAB3 release',
+    prog='main.py build-db',
+  )
+
+  parser.add_argument(
+    '--biogrid_db', '-db',
+    help='Output database file',
+    required=True,
+  )
+  parser.add_argument(
+    '--tab3', '-t',
+    help='BioGRID release in TAB3 format, e.g. BIOGRID-ALL-4.4.200.tab3.txt',
+    required=True,
+  )
+
+  return parser.parse_args(args)
 
 def read_identifiers(options):
   '''
@@ -175,9 +324,10 @@ def read_identifiers(options):
 def read_id_map(options):
   '''
   Read in a file with a mapping of identifier types, and create a dict
-  of the input identifier type to entrez. When creating a map from
-  symbols, first add official symbols to the map, then aliases and finally
-  previous symbols.
+  of the input identifier type to entrez. Identifiers are lowercased so that
+  lookups are case insensitive. When creating a map from symbols, first add
+  previous symbols to the map, then aliases and finally official symbols, so
+  that official symbols take priority.
   '''
 
   genemapfile = options.genemap
@@ -187,83 +337,59 @@ def read_id_map(options):
     data = json.load(json_data)
 
     genemap = {}
+
+    def add(id, entrez):
+      # Null identifiers can't match an input identifier and are skipped.
+      if isinstance(id, str):
+        genemap[id.lower()] = entrez
+
     string_ids = ['ensemblg', 'entrez']
     if idtype != 'symbol' and idtype not in string_ids:
       for ids in data.values():
         for id in ids[idtype]:
-          genemap[id] = ids['entrez']
+          add(id, ids['entrez'])
 
     if idtype == 'symbol':
-      aliases = {}
-      prev_symbols = {}
-      symbols = {}
       for ids in data.values():
-        symbols[ids['symbol']] = ids['entrez']
-        for id in ids['aliasSymbol']:
-          aliases[id] = ids['entrez']
         for id in ids['prevSymbol']:
-          prev_symbols[id] = ids['entrez']
-      genemap = {**prev_symbols, **aliases, **symbols}
-  
+          add(id, ids['entrez'])
+      for ids in data.values():
+        for id in ids['aliasSymbol']:
+          add(id, ids['entrez'])
+      for ids in data.values():
+        add(ids['symbol'], ids['entrez'])
+
     if idtype in string_ids:
       for ids in data.values():
-        genemap[ids[idtype]] = ids['entrez']
-    
+        add(ids[idtype], ids['entrez'])
+
     return genemap
 
-'''
-Case insensitive dictionary.
-'''
-class CaseInsensitiveDict(dict):
-  @classmethod
-  def _k(cls, key):
-    return key.lower() if isinstance(key, str) else key
-
-  def __init__(self, *args, **kwargs):
-    super(CaseInsensitiveDict, self).__init__(*args, **kwargs)
-    self._convert_keys()
-  def __getitem__(self, key):
-    return super(CaseInsensitiveDict, self).__getitem__(self.__class__._k(key))
-  def __setitem__(self, key, value):
-    super(CaseInsensitiveDict, self).__setitem__(self.__class__._k(key), value)
-  def __delitem__(self, key):
-    return super(CaseInsensitiveDict, self).__delitem__(self.__class__._k(key))
-  def __contains__(self, key):
-    return super(CaseInsensitiveDict, self).__contains__(self.__class__._k(key))
-  def has_key(self, key):
-    return super(CaseInsensitiveDict, self).has_key(self.__class__._k(key))
-  def pop(self, key, *args, **kwargs):
-    return super(CaseInsensitiveDict, self).pop(self.__class__._k(key), *args, **kwargs)
-  def get(self, key, *args, **kwargs):
-    return super(CaseInsensitiveDict, self).get(self.__class__._k(key), *args, **kwargs)
-  def setdefault(self, key, *args, **kwargs):
-    return super(CaseInsensitiveDict, self).setdefault(self.__class__._k(key), *args, **kwargs)
-  def update(self, E={}, **F):
-    super(CaseInsensitiveDict, self).update(self.__class__(E))
-    super(CaseInsensitiveDict, self).update(self.__class__(**F))
-  def _convert_keys(self):
-    for k in list(self.keys()):
-      v = super(CaseInsensitiveDict, self).pop(k)
-      self.__setitem__(k, v)
-    
+def lookup_identifiers(ids, id_map):
+  '''
+  Look up identifiers in a lowercased id_map. Returns (id, entrez) pairs for
+  identifiers in the map.
+  '''
+  entrez_ids = map(id_map.get, [id.lower() for id in ids])
+  return [(id, entrez) for id, entrez in zip(ids, entrez_ids) if entrez is not None]
+
 def map_identifiers(ids, interactions, id_map):
   '''
   Create a mapping of input IDs to Entrez IDs. If prey interactions were extracted
   from a SAINT file, convert bait and prey IDs as well. Tests for identifier mapping
-  are case insensitive.
+  are case insensitive: id_map keys must be lowercase (see read_id_map).
   '''
-  ci_id_map = CaseInsensitiveDict(id_map)
-  mapped_ids = {ci_id_map[id.lower()]: id for id in ids if id.lower() in ci_id_map}
+  mapped_ids = {entrez: id for id, entrez in lookup_identifiers(ids, id_map)}
 
   mapped_interactions = {
-      ci_id_map[source.lower()]: {
+      entrez: {
         'symbol': source,
-        'targets': {ci_id_map[id.lower()]: { 'symbol': id } for id in targets if id.lower() in ci_id_map}
+        'targets': {target_entrez: { 'symbol': id } for id, target_entrez in lookup_identifiers(interactions[source], id_map)}
       }
-      for source, targets in interactions.items() if source.lower() in ci_id_map
+      for source, entrez in lookup_identifiers(list(interactions.keys()), id_map)
   }
   return mapped_ids, mapped_interactions
-  
+
 def create_post_data(options, ids):
   '''
   Create data object for the POST request to BioGRID.
@@ -289,34 +415,633 @@ def create_post_data(options, ids):
 
   return data
 
-def fetch_interactions(data):
+def create_session(workers):
+  '''
+  Create a session whose connection pool can serve one connection per worker.
+  '''
+  session = requests.Session()
+  adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+  session.mount('http://', adapter)
+  session.mount('https://', adapter)
+  return session
+
+def count_interactions(session, url, data):
+  '''
+  Get the total number of interactions matching a query.
+  '''
+  r = session.post(url, data={ **data, 'format': 'count' })
+  r.raise_for_status()
+  return int(r.text.strip())
+
+def iterate_response_text(response, chunk_size=65536):
+  decoder = codecs.getincrementaldecoder('utf-8')()
+  for chunk in response.iter_content(chunk_size):
+    yield decoder.decode(chunk)
+  yield decoder.decode(b'', final=True)
+
+def iterate_json_values(chunks):
+  '''
+  Incrementally parse a JSON object (or array) from text chunks, yielding each
+  of its values as soon as it is complete, so the full document is never held
+  in memory.
+  '''
+  decoder = json.JSONDecoder()
+  whitespace = ' \t\n\r'
+  chunks = iter(chunks)
+  buffer = ''
+  position = 0
+  is_object = None
+  expect_key = True
+
+  def read_more():
+    nonlocal buffer, position
+    chunk = next(chunks, None)
+    if chunk is None:
+      raise ValueError('Incomplete JSON response')
+    buffer = buffer[position:] + chunk
+    position = 0
+
+  while True:
+    while position < len(buffer) and buffer[position] in whitespace:
+      position += 1
+    if position == len(buffer):
+      read_more()
+      continue
+
+    char = buffer[position]
+    if is_object is None:
+      if char not in '{[':
+        raise ValueError(f'Expected a JSON object or array, found "{char}"')
+      is_object = char == '{'
+      position += 1
+      continue
+    if char in '}]':
+      return
+    if char == ',':
+      position += 1
+      continue
+    if is_object and expect_key:
+      try:
+        _, end = decoder.raw_decode(buffer, position)
+        colon = buffer.index(':', end)
+      except ValueError:
+        read_more()
+        continue
+      position = colon + 1
+      expect_key = False
+      continue
+
+    try:
+      value, end = decoder.raw_decode(buffer, position)
+    except ValueError:
+      read_more()
+      continue
+    position = end
+    expect_key = True
+    yield value
+
+def fetch_page(session, url, data, start, size):
+  with session.post(url, data={ **data, 'max': size, 'start': start }, stream=True) as r:
+    r.raise_for_status()
+    return list(iterate_json_values(iterate_response_text(r)))
+
+def get_pages(total, limit, page_size):
+  '''
+  Split the first "limit" results (all if limit is 0) into (start, size) pages.
+  '''
+  if limit > 0:
+    total = min(total, limit)
+  return [(start, min(page_size, total - start)) for start in range(0, total, page_size)]
+
+def iterate_in_order(executor, function, items, window):
+  '''
+  Call function on each item in the executor, with at most "window" calls submitted
+  at once, and yield the results in item order. No more than "window" results are
+  held in memory at once.
+  '''
+  items = iter(items)
+  pending = collections.deque(executor.submit(function, item) for item in itertools.islice(items, window))
+  while pending:
+    result = pending.popleft().result()
+    item = next(items, None)
+    if item is not None:
+      pending.append(executor.submit(function, item))
+    yield result
+
+def fetch_interactions(data, url=BIOGRID_URL, workers=4, page_size=BIOGRID_PAGE_SIZE, session=None):
+  '''
+  Fetch interactions from BioGRID. The number of matching interactions is requested
+  first and the results are then fetched in pages, with up to "workers" pages
+  requested concurrently. Interactions are yielded in page order, and no more than
+  "workers" pages are held in memory at once. A session is created unless one is given.
+  '''
+  workers = max(1, workers)
+  with contextlib.nullcontext(session) if session else create_session(workers) as session:
+    total = count_interactions(session, url, data)
+    pages = get_pages(total, data['max'], page_size)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+      def fetch(page):
+        return fetch_page(session, url, data, *page)
+
+      for interactions in iterate_in_order(executor, fetch, pages, workers):
+        yield from interactions
+
+def split_gene_list(data, shard_size):
+  genes = [id for id in data['geneList'].split('|') if id]
+  return [genes[start:start + shard_size] for start in range(0, len(genes), shard_size)]
+
+def fetch_shard(session, url, data, shard, page_size=BIOGRID_PAGE_SIZE):
+  '''
+  Fetch the interactions for a shard of the gene list, one page at a time.
+  '''
+  shard_data = { **data, 'geneList': '|'.join(shard) }
+  total = count_interactions(session, url, shard_data)
+  return [
+    interaction
+    for page in get_pages(total, shard_data['max'], page_size)
+    for interaction in fetch_page(session, url, shard_data, *page)
+  ]
+
+def fetch_sharded_interactions(data, options, url=BIOGRID_URL):
+  '''
+  Split the gene list into shards of options.shard_size genes and fetch them
+  concurrently, with up to options.workers shards in flight on a pooled session.
+  Interactions are yielded shard by shard in gene list order as soon as each shard
+  arrives, so they can be written while later shards are still being fetched, and
+  no more than options.workers shards are held in memory at once. Interactions
+  returned for more than one shard are only yielded once. Only valid for queries
+  where the result is the union of the results for each gene (see is_cacheable_query).
+  '''
+  shards = split_gene_list(data, options.shard_size)
+  workers = max(1, options.workers)
+
+  with create_session(workers) as session, concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+    def fetch(shard):
+      return fetch_shard(session, url, data, shard)
+
+    seen = set()
+    for interactions in iterate_in_order(executor, fetch, shards, workers):
+      for interaction in interactions:
+        if interaction['BIOGRID_INTERACTION_ID'] not in seen:
+          seen.add(interaction['BIOGRID_INTERACTION_ID'])
+          yield interaction
+
+def is_cacheable_query(data):
+  '''
+  Responses can only be cached by gene when the result for a gene list is the union of the
+  results for each gene, i.e. when all first order interactors are fetched and nothing else.
+  '''
+  return (
+    data['includeInteractors']
+    and not data['includeInteractorInteractions']
+    and data['max'] == 0
+  )
+
+def create_cache_key(data):
+  '''
+  Identify the query filters in the cache, i.e. everything but the genes, key and limit.
+  '''
+  excluded = ['accessKey', 'format', 'geneList', 'max']
+  return json.dumps({ key: data[key] for key in sorted(data.keys()) if key not in excluded })
+
+def open_cache(cachefile):
+  connection = sqlite3.connect(cachefile)
+  connection.execute(
+    'CREATE TABLE IF NOT EXISTS responses '
+    '(gene TEXT, query TEXT, fetched REAL, size INTEGER, interactions TEXT, PRIMARY KEY (gene, query))'
+  )
+  return connection
+
+def read_cache(connection, genes, query, ttl):
+  '''
+  Get cached interactions for genes fetched within the last "ttl" days and a list
+  of genes that need to be fetched.
+  '''
+  oldest = time.time() - ttl * 86400
+  cached = {}
+  for gene in genes:
+    row = connection.execute(
+      'SELECT interactions FROM responses WHERE gene = ? AND query = ? AND fetched >= ?',
+      (gene, query, oldest),
+    ).fetchone()
+    if row:
+      cached[gene] = json.loads(row[0])
+
+  missing = [gene for gene in genes if gene not in cached]
+  return cached, missing
+
+def split_interactions_by_gene(interactions, genes, data):
+  '''
+  Assign fetched interactions to the query genes that would have returned them
+  when queried alone. Genes without interactions get an empty list.
+  '''
+  tax_ids = None
+  if str(data['taxId']).lower() != 'all':
+    tax_ids = set(str(data['taxId']).split('|'))
+
+  interactions_by_gene = { gene: [] for gene in genes }
+  for interaction in interactions:
+    matched = set()
+    for interactor in ['A', 'B']:
+      gene = str(interaction[f'ENTREZ_GENE_{interactor}'])
+      organism = str(interaction[f'ORGANISM_{interactor}'])
+      if gene in interactions_by_gene and (tax_ids is None or organism in tax_ids):
+        matched.add(gene)
+    for gene in matched:
+      interactions_by_gene[gene].append(interaction)
+  return interactions_by_gene
+
+def write_cache(connection, interactions_by_gene, query):
+  fetched = time.time()
+  rows = []
+  for gene, interactions in interactions_by_gene.items():
+    serialized = json.dumps(interactions)
+    rows.append((gene, query, fetched, len(serialized), serialized))
+  connection.executemany('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)', rows)
+  connection.commit()
+
+def evict_cache(connection, size_limit):
+  '''
+  When the cache holds more than "size_limit" MB, remove the oldest responses until it
+  holds at most CACHE_EVICTION_TARGET of the limit, so that eviction is not needed again
+  on the next runs. The database is not vacuumed: freed pages are reused by later
+  responses, so the file does not grow much beyond the limit.
+  '''
+  limit = size_limit * 1024 * 1024
+  total = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+  if total <= limit:
+    return
+
+  target = limit * CACHE_EVICTION_TARGET
+  removed = []
+  for rowid, size in connection.execute('SELECT rowid, size FROM responses ORDER BY fetched, rowid'):
+    if total <= target:
+      break
+    removed.append((rowid,))
+    total -= size
+  connection.executemany('DELETE FROM responses WHERE rowid = ?', removed)
+  connection.commit()
+
+def merge_interactions(*interaction_lists):
+  '''
+  Merge lists of BioGRID interactions, removing duplicates and ordering by interaction ID.
+  '''
+  merged = {}
+  for interactions in interaction_lists:
+    for interaction in interactions:
+      merged[interaction['BIOGRID_INTERACTION_ID']] = interaction
+  return [merged[id] for id in sorted(merged.keys())]
+
+def fetch_cached_interactions(data, options, url=BIOGRID_URL):
+  '''
+  Fetch interactions from BioGRID, using cached responses for genes when possible
+  (see is_cacheable_query).
+  '''
+  if not options.cache or not is_cacheable_query(data):
+    return fetch_interactions(data, url=url, workers=options.workers)
+
+  genes = [id for id in data['geneList'].split('|') if id]
+  query = create_cache_key(data)
+  connection = open_cache(options.cache)
+  cached, missing = read_cache(connection, genes, query, options.cache_ttl)
+
+  fetched = []
+  if missing:
+    fetched = list(fetch_interactions({ **data, 'geneList': '|'.join(missing) }, url=url, workers=options.workers))
+    write_cache(connection, split_interactions_by_gene(fetched, missing, data), query)
+    evict_cache(connection, options.cache_size)
+  connection.close()
+
+  return merge_interactions(*cached.values(), fetched)
+
+def create_adjacency_index(interactions):
+  '''
+  Index interactions by gene: "neighbours" maps each gene to the set of genes it
+  interacts with and "edges" maps gene pairs to their interactions.
+  '''
+  neighbours = collections.defaultdict(set)
+  edges = collections.defaultdict(list)
+  for interaction in interactions:
+    gene_a = str(interaction['ENTREZ_GENE_A'])
+    gene_b = str(interaction['ENTREZ_GENE_B'])
+    neighbours[gene_a].add(gene_b)
+    neighbours[gene_b].add(gene_a)
+    edges[(gene_a, gene_b)].append(interaction)
+  return { 'edges': edges, 'neighbours': neighbours }
+
+def get_induced_interactions(index, genes):
+  '''
+  Get all indexed interactions with both interactors in genes.
+  '''
+  induced = []
+  for gene in genes:
+    for neighbour in index['neighbours'].get(gene, set()) & genes:
+      induced.extend(index['edges'].get((gene, neighbour), []))
+  return induced
+
+def fetch_secondary_interactions_locally(data, options, url=BIOGRID_URL):
+  '''
+  Equivalent to a BioGRID query with includeInteractorInteractions. The first order
+  interactors of the gene list are fetched, then the first order interactors of
+  each of those, and interactions between interactors are found locally. Both
+  requests are primary interaction queries, so responses are cached by gene
+  when a cache is used.
+  '''
+  primary_data = { **data, 'includeInteractorInteractions': False, 'max': 0 }
+  primary = list(fetch_cached_interactions(primary_data, options, url=url))
+
+  genes = set(id for id in data['geneList'].split('|') if id)
+  interactors = set(genes)
+  for interaction in primary:
+    interactors.add(str(interaction['ENTREZ_GENE_A']))
+    interactors.add(str(interaction['ENTREZ_GENE_B']))
+
+  neighbourhoods = []
+  if interactors - genes:
+    neighbourhood_data = { **primary_data, 'geneList': '|'.join(sorted(interactors - genes)) }
+    neighbourhoods = fetch_cached_interactions(neighbourhood_data, options, url=url)
+
+  index = create_adjacency_index(neighbourhoods)
+  interactions = merge_interactions(primary, get_induced_interactions(index, interactors))
+  if data['max'] > 0:
+    interactions = interactions[:data['max']]
+  return interactions
+
+def build_local_database(tab3file, dbfile):
   '''
-  Fetch interactions from BioGRID
+  Read a BioGRID TAB3 release into an SQLite database with one row per interaction,
+  using the field names returned by the web service, and index the Entrez IDs
+  of both interactors.
   '''
-  url = 'https://webservice.thebiogrid.org/interactions/'
-  r = requests.post(url, data=data)
-  return [entry for entry in r.json().values()]
+  fields = list(TAB3_FIELDS.values())
+  column_definitions = ', '.join(
+    f'{field} INTEGER' if field in TAB3_INTEGER_FIELDS else f'{field} TEXT'
+    for field in fields
+  )
+
+  if os.path.exists(dbfile):
+    os.remove(dbfile)
+
+  with open(tab3file, 'r', newline='') as f, sqlite3.connect(dbfile) as connection:
+    reader = csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
+    header = next(reader)
+    column_indices = [header.index(column) for column in TAB3_FIELDS.keys()]
+    pubmed_index = fields.index('PUBMED_ID')
+
+    def parse_row(row):
+      values = [row[index] for index in column_indices]
+      values[pubmed_index] = values[pubmed_index].split(':')[-1]
+      return values
+
+    connection.execute(f'CREATE TABLE interactions ({column_definitions})')
+    connection.executemany(
+      f'INSERT INTO interactions VALUES ({", ".join("?" * len(fields))})',
+      (parse_row(row) for row in reader if row),
+    )
+    connection.execute('CREATE INDEX interactions_entrez_a ON interactions (ENTREZ_GENE_A)')
+    connection.execute('CREATE INDEX interactions_entrez_b ON interactions (ENTREZ_GENE_B)')
+  connection.close()
+
+def create_local_filters(data):
+  '''
+  Create SQL conditions (and their parameters) for the filters in the
+  BioGRID POST data, other than those on the gene list.
+  '''
+  conditions = []
+  params = []
+
+  if data['selfInteractionsExcluded']:
+    conditions.append('ENTREZ_GENE_A != ENTREZ_GENE_B')
+  if data['interSpeciesExcluded']:
+    conditions.append('ORGANISM_A = ORGANISM_B')
+
+  throughput_tag = str(data['throughputTag']).lower()
+  if throughput_tag in ['low', 'high']:
+    conditions.append('THROUGHPUT LIKE ?')
+    params.append(f'%{throughput_tag} throughput%')
+
+  if data.get('evidenceList'):
+    evidence = [code.lower() for code in data['evidenceList'].split('|')]
+    operator = 'IN' if data['includeEvidence'] else 'NOT IN'
+    conditions.append(f'lower(EXPERIMENTAL_SYSTEM) {operator} ({", ".join("?" * len(evidence))})')
+    params.extend(evidence)
+
+  return conditions, params
+
+def create_local_taxonomy_filter(data, interactor):
+  if str(data['taxId']).lower() == 'all':
+    return [], []
+  tax_ids = [int(tax_id) for tax_id in str(data['taxId']).split('|')]
+  return [f'ORGANISM_{interactor} IN ({", ".join("?" * len(tax_ids))})'], tax_ids
+
+def query_local_interactions(dbfile, data):
+  '''
+  Answer a BioGRID query (see create_post_data) from a local database. Interactions
+  are returned in the same format as fetch_interactions and, as with the web service,
+  at most "max" interactions are returned unless it is 0.
+  '''
+  genes = [id for id in data['geneList'].split('|') if id]
+  filters, filter_params = create_local_filters(data)
+
+  def select(gene_conditions, gene_params):
+    conditions = [*gene_conditions, *filters]
+    where = ' AND '.join(conditions) if conditions else '1'
+    return f'SELECT * FROM interactions WHERE {where}', [*gene_params, *filter_params]
+
+  def taxonomy(interactor):
+    return create_local_taxonomy_filter(data, interactor)
+
+  # Opened read-only so a mistyped path raises an error instead of creating an empty database.
+  with sqlite3.connect(f'{Path(dbfile).absolute().as_uri()}?mode=ro', uri=True) as connection:
+    connection.row_factory = sqlite3.Row
+    connection.execute('CREATE TEMP TABLE query_genes (id TEXT PRIMARY KEY)')
+    connection.executemany('INSERT OR IGNORE INTO query_genes VALUES (?)', ((id,) for id in genes))
+
+    tax_a, tax_a_params = taxonomy('A')
+    tax_b, tax_b_params = taxonomy('B')
+    in_a = 'ENTREZ_GENE_A IN (SELECT id FROM query_genes)'
+    in_b = 'ENTREZ_GENE_B IN (SELECT id FROM query_genes)'
+
+    queries = []
+    if data['includeInteractors']:
+      queries.append(select([in_a, *tax_a], tax_a_params))
+      queries.append(select([in_b, *tax_b], tax_b_params))
+    else:
+      queries.append(select([in_a, in_b, *tax_a, *tax_b], [*tax_a_params, *tax_b_params]))
+
+    interactions = {}
+    for query, params in queries:
+      for row in connection.execute(query, params):
+        interactions[row['BIOGRID_INTERACTION_ID']] = dict(row)
+
+    if data['includeInteractors'] and data['includeInteractorInteractions']:
+      interactors = set(genes)
+      for interaction in interactions.values():
+        interactors.add(interaction['ENTREZ_GENE_A'])
+        interactors.add(interaction['ENTREZ_GENE_B'])
+      connection.execute('CREATE TEMP TABLE query_interactors (id TEXT PRIMARY KEY)')
+      connection.executemany('INSERT INTO query_interactors VALUES (?)', ((id,) for id in interactors))
+
+      query, params = select([
+        'ENTREZ_GENE_A IN (SELECT id FROM query_interactors)',
+        'ENTREZ_GENE_B IN (SELECT id FROM query_interactors)',
+        *tax_a,
+        *tax_b,
+      ], [*tax_a_params, *tax_b_params])
+      for row in connection.execute(query, params):
+        interactions[row['BIOGRID_INTERACTION_ID']] = dict(row)
+  connection.close()
+
+  ids = sorted(interactions.keys())
+  if data.get('max', 0) > 0:
+    ids = ids[:data['max']]
+  return [interactions[id] for id in ids]
+
+def write_tsv_rows(f, rows):
+  '''
+  Write rows as tab-separated lines. Values are written as their string
+  representation without quoting or escaping.
+  '''
+  f.writelines('\t'.join([str(value) for value in row]) + '\n' for row in rows)
 
 def write_biogrid_data(interactions):
   '''
-  Write BioGRID data as a tsv file, with one interaction per row.
+  Write BioGRID data as a tsv file, with one interaction per row. The columns are
+  the fields of the first interaction; fields missing from later interactions are
+  left empty. Interactions can be any iterable and are written as they arrive;
+  they are returned reduced to the fields needed for building the network (PAIR_FIELDS).
   '''
+  pairs = []
+  interactions = iter(interactions)
+  first = next(interactions, None)
+
   with open('./biogrid-interactions.txt', 'w') as f:
-    fields = [key for key in interactions[0].keys()]
-    f.write('\t'.join(fields))
-    f.write('\n')
+    if first is None:
+      return pairs
 
-    for interaction in interactions:
-      values = [str(value) for value in interaction.values()]
-      f.write('\t'.join(values))
-      f.write('\n')
+    fields = list(first.keys())
 
-def extract_interaction_pairs(biogrid_data, ids):
+    def rows():
+      yield fields
+      for interaction in itertools.chain([first], interactions):
+        pairs.append({ field: interaction[field] for field in PAIR_FIELDS })
+        yield [interaction.get(field, '') for field in fields]
+    write_tsv_rows(f, rows())
+
+  return pairs
+
+def create_graph():
+  '''
+  Create an empty interaction graph. Node (Entrez) IDs and symbols are interned
+  to integers, and edges are stored as parallel arrays of source node, target node,
+  target symbol and flags (ISPREY, KNOWN). "source_symbols" maps source nodes to
+  their symbol in the order sources were added.
+  '''
+  return {
+    'edge_flags': bytearray(),
+    'edge_index': {},
+    'edge_sources': array('i'),
+    'edge_symbols': array('i'),
+    'edge_targets': array('i'),
+    'node_index': {},
+    'nodes': [],
+    'source_symbols': {},
+    'symbol_index': {},
+    'symbols': [],
+  }
+
+def intern_value(values, index, value):
+  position = index.get(value)
+  if position is None:
+    position = len(values)
+    index[value] = position
+    values.append(value)
+  return position
+
+def intern_node(graph, id):
+  return intern_value(graph['nodes'], graph['node_index'], id)
+
+def intern_symbol(graph, symbol):
+  return intern_value(graph['symbols'], graph['symbol_index'], symbol)
+
+def add_source(graph, source, symbol):
+  '''
+  Add a source node with its symbol, unless it is already a source.
   '''
-  Create a minimal representation of the BioGRID data as a 2D dict
-  indexed by input id tuple (source_id;source_symbol) and target id.
+  node = intern_node(graph, source)
+  if node not in graph['source_symbols']:
+    graph['source_symbols'][node] = intern_symbol(graph, symbol)
+
+def add_edge(graph, source, target, symbol, flags=0):
+  '''
+  Add an edge from source to target, or for an existing edge, replace the target
+  symbol and add the flags.
+  '''
+  source_node = intern_node(graph, source)
+  target_node = intern_node(graph, target)
+  symbol_index = intern_symbol(graph, symbol)
+  key = (source_node << 32) | target_node
+
+  edge = graph['edge_index'].get(key)
+  if edge is None:
+    graph['edge_index'][key] = len(graph['edge_flags'])
+    graph['edge_flags'].append(flags)
+    graph['edge_sources'].append(source_node)
+    graph['edge_symbols'].append(symbol_index)
+    graph['edge_targets'].append(target_node)
+  else:
+    graph['edge_flags'][edge] |= flags
+    graph['edge_symbols'][edge] = symbol_index
+
+def iterate_edges(graph):
+  '''
+  Yield (source, source symbol, target, target symbol, isprey, known) for each edge,
+  grouped by source in the order sources were added and otherwise in the order
+  edges were added.
+  '''
+  nodes = graph['nodes']
+  symbols = graph['symbols']
+  source_symbols = graph['source_symbols']
+  source_order = {node: position for position, node in enumerate(source_symbols)}
+  edge_sources = graph['edge_sources']
+
+  edges = sorted(range(len(edge_sources)), key=lambda edge: source_order[edge_sources[edge]])
+  for edge in edges:
+    source = edge_sources[edge]
+    flags = graph['edge_flags'][edge]
+    yield (
+      nodes[source],
+      symbols[source_symbols[source]],
+      nodes[graph['edge_targets'][edge]],
+      symbols[graph['edge_symbols'][edge]],
+      bool(flags & ISPREY),
+      bool(flags & KNOWN),
+    )
+
+def graph_to_dict(graph, flags=True):
+  '''
+  Convert a graph to a 2D dict indexed by source id and target id.
   '''
   interactions = {}
+  for source, source_symbol, target, target_symbol, isprey, known in iterate_edges(graph):
+    if source not in interactions:
+      interactions[source] = {
+        'symbol': source_symbol,
+        'targets': {},
+      }
+    target_data = { 'symbol': target_symbol }
+    if flags:
+      target_data['isprey'] = isprey
+      target_data['known'] = known
+    interactions[source]['targets'][target] = target_data
+  return interactions
+
+def extract_interaction_pairs(biogrid_data, ids):
+  '''
+  Create a minimal representation of the BioGRID data as a graph (see create_graph)
+  with input ids as sources.
+  '''
+  graph = create_graph()
 
   for datum in biogrid_data:
     source_id = datum['ENTREZ_GENE_A']
@@ -326,94 +1051,202 @@ def extract_interaction_pairs(biogrid_data, ids):
     if target_id in ids:
       source_id, target_id = target_id, source_id
       source_symbol, target_symbol = target_symbol, source_symbol
-    if source_id not in interactions:
-      interactions[source_id] = {
-        'symbol': source_symbol,
-        'targets': {},
-      }
-    interactions[source_id]['targets'][target_id] = { 'symbol': target_symbol }
+    add_source(graph, source_id, source_symbol)
+    add_edge(graph, source_id, target_id, target_symbol)
 
-  return interactions
+  return graph
 
-def merge_input_interactions(interactions, input_interactions):
+def merge_input_interactions(graph, input_interactions):
   '''
-  Merge any input interactions with data from BioGRID.
+  Merge any input interactions into the graph of BioGRID data. All BioGRID
+  interactions are flagged as known and all input interactions as preys.
   '''
-  sources = list(set([*interactions.keys(), *input_interactions.keys()]))
+  graph['edge_flags'] = bytearray(flags | KNOWN for flags in graph['edge_flags'])
 
-  merged = { source: { 'targets': {} } for source in sources}
-  for source in sources:
-    merged[source]['symbol'] = interactions[source]['symbol'] if source in interactions else input_interactions[source]['symbol']
-    targets = {
-      **interactions.get(source, { 'targets': {} })['targets'],
-      **input_interactions.get(source, { 'targets': {} })['targets'],
-    }
-    for target, target_data in targets.items():
-      merged[source]['targets'][target] = {
-        'isprey': target in input_interactions.get(source, { 'targets': {} })['targets'],
-        'known': target in interactions.get(source, { 'targets': {} })['targets'],
-        'symbol': target_data['symbol'],
-      }
+  for source, source_data in input_interactions.items():
+    add_source(graph, source, source_data['symbol'])
+    for target, target_data in source_data['targets'].items():
+      add_edge(graph, source, target, target_data['symbol'], ISPREY)
 
-  return merged
+  return graph
 
-def consolidate_symbols(id_type, interactions, input_ids, input_interactions):
+def consolidate_symbols(id_type, graph, input_ids, input_interactions):
   '''
   Input gene symbols and those returned from BioGRID can disagree, so always use
   input symbols whenever possible.
   '''
 
   if id_type != 'symbol':
-    return interactions
+    return graph
 
   input_ids_to_symbol = {}
   for source_data in input_interactions.values():
-    id_to_symbol = {id: v['symbol'] for id, v in source_data['targets'].items()}
-    input_ids_to_symbol = {
-      **input_ids_to_symbol,
-      **id_to_symbol,
-    }
-  input_ids_to_symbol = {
-    **input_ids_to_symbol,
-    **input_ids,
-  }
+    for id, target_data in source_data['targets'].items():
+      input_ids_to_symbol[id] = target_data['symbol']
+  input_ids_to_symbol.update(input_ids)
 
-  return {
-    source: {
-      'symbol': input_ids_to_symbol.get(source, source_data['symbol']),
-      'targets': {
-        target: {
-          **target_data,
-          'symbol': input_ids_to_symbol.get(target, target_data['symbol'])
-        }
-        for target, target_data in source_data['targets'].items()
-      }
-    } for source, source_data in interactions.items()}
+  node_symbols = [
+    intern_symbol(graph, input_ids_to_symbol[id]) if id in input_ids_to_symbol else None
+    for id in graph['nodes']
+  ]
+
+  for node in graph['source_symbols']:
+    if node_symbols[node] is not None:
+      graph['source_symbols'][node] = node_symbols[node]
+
+  edge_symbols = graph['edge_symbols']
+  for edge, target in enumerate(graph['edge_targets']):
+    if node_symbols[target] is not None:
+      edge_symbols[edge] = node_symbols[target]
+
+  return graph
 
-def write_interactions(interactions, input_ids, options):
+def is_saint_network(options):
+  return options.is_saint and options.include_saint_interactions
+
+def get_network_table(graph, input_ids, options):
+  '''
+  Get the header and rows of the network table. SAINT networks include the prey and
+  known status of targets, and for identifiers other than symbols the input ID of
+  sources is included.
+  '''
+  edges = iterate_edges(graph)
+
+  if is_saint_network(options):
+    header = ['source', 'source Entrez', 'target', 'target Entrez', 'is target a prey', 'is target known']
+    rows = (
+      [source_symbol, source, target_symbol, target, isprey, known]
+      for source, source_symbol, target, target_symbol, isprey, known in edges
+    )
+  elif options.id_type == 'symbol':
+    header = ['source', 'source Entrez', 'target', 'target Entrez']
+    rows = (
+      [source_symbol, source, target_symbol, target]
+      for source, source_symbol, target, target_symbol, _, _ in edges
+    )
+  else:
+    header = ['source ID', 'source symbol', 'source Entrez', 'target symbol', 'target Entrez']
+    rows = (
+      [input_ids.get(source, ''), source_symbol, source, target_symbol, target]
+      for source, source_symbol, target, target_symbol, _, _ in edges
+    )
+
+  return header, rows
+
+def iterate_nodes(graph):
   '''
-  Write interactions as a tsv file.
+  Yield (id, symbol) for each node in the network, sources first. Targets
+  that are not sources use their symbol from the first edge to them.
   '''
-  id_type = options.id_type
-  include_saint_interactions = options.include_saint_interactions
-  is_saint = options.is_saint
+  node_symbols = dict(graph['source_symbols'])
+  for target, symbol in zip(graph['edge_targets'], graph['edge_symbols']):
+    node_symbols.setdefault(target, symbol)
+
+  for node, symbol in node_symbols.items():
+    yield graph['nodes'][node], graph['symbols'][symbol]
 
+def get_network_attributes(graph, input_ids, options):
+  '''
+  Get generators of node and edge attribute dicts for graph formats.
+  '''
+  include_input_id = options.id_type != 'symbol'
+  include_flags = is_saint_network(options)
+
+  def nodes():
+    for id, symbol in iterate_nodes(graph):
+      node = { 'id': id, 'name': symbol }
+      if include_input_id:
+        node['input_id'] = input_ids.get(id, '')
+      yield node
+
+  def edges():
+    for source, _, target, _, isprey, known in iterate_edges(graph):
+      edge = { 'source': source, 'target': target }
+      if include_flags:
+        edge['isprey'] = isprey
+        edge['known'] = known
+      yield edge
+
+  return nodes(), edges()
+
+def write_network_tsv(graph, input_ids, options):
+  header, rows = get_network_table(graph, input_ids, options)
   with open('./cytoscape.txt', 'w') as f:
-    if is_saint and include_saint_interactions:
-      f.write('source\tsource Entrez\ttarget\ttarget Entrez\tis target a prey\tis target known\n')
-      for source, source_data in interactions.items():
-        for target, target_data in source_data['targets'].items():
-          f.write(f'{source_data["symbol"]}\t{source}\t{target_data["symbol"]}\t{target}\t{target_data["isprey"]}\t{target_data["known"]}\n')
-    elif id_type == 'symbol':
-      f.write('source\tsource Entrez\ttarget\ttarget Entrez\n')
-      for source, source_data in interactions.items():
-        for target, target_data in source_data['targets'].items():
-          f.write(f'{source_data["symbol"]}\t{source}\t{target_data["symbol"]}\t{target}\n')
-    else:
-      f.write('source ID\tsource symbol\tsource Entrez\ttarget symbol\ttarget Entrez\n')
-      for source, source_data in interactions.items():
-        for target, target_data in source_data['targets'].items():
-          f.write(f'{input_ids.get(source, "")}\t{source_data["symbol"]}\t{source}\t{target_data["symbol"]}\t{target}\n')
+    write_tsv_rows(f, itertools.chain([header], rows))
+
+def write_network_json(graph, input_ids, options):
+  '''
+  Write the network in Cytoscape JSON format, one element per line.
+  '''
+  nodes, edges = get_network_attributes(graph, input_ids, options)
+  with open('./cytoscape.json', 'w') as f:
+    # Elements are written as they are produced, with the separator before every
+    # element after the first, so the document is never held in memory.
+    f.write('{"elements": {\n"nodes": [\n')
+    f.writelines(
+      (',\n' if index else '') + json.dumps({ 'data': node }) for index, node in enumerate(nodes)
+    )
+    f.write('\n],\n"edges": [\n')
+    f.writelines(
+      (',\n' if index else '') + json.dumps({ 'data': { 'id': f'e{index}', **edge } })
+      for index, edge in enumerate(edges)
+    )
+    f.write('\n]\n}}\n')
+
+def write_network_graphml(graph, input_ids, options):
+  '''
+  Write the network in GraphML format.
+  '''
+  keys = [('name', 'node', 'name', 'string')]
+  if options.id_type != 'symbol':
+    keys.append(('input_id', 'node', 'input ID', 'string'))
+  if is_saint_network(options):
+    keys.append(('isprey', 'edge', 'is target a prey', 'boolean'))
+    keys.append(('known', 'edge', 'is target known', 'boolean'))
+
+  def format_data(element, excluded):
+    return ''.join(
+      f'<data key="{key}">{escape(str(value).lower() if isinstance(value, bool) else str(value))}</data>'
+      for key, value in element.items() if key not in excluded
+    )
+
+  nodes, edges = get_network_attributes(graph, input_ids, options)
+  with open('./cytoscape.graphml', 'w') as f:
+    f.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    f.write('<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n')
+    for id, domain, name, value_type in keys:
+      f.write(f'  <key id="{id}" for="{domain}" attr.name="{name}" attr.type="{value_type}"/>\n')
+    f.write('  <graph id="network" edgedefault="directed">\n')
+    f.writelines(
+      f'    <node id={quoteattr(node["id"])}>{format_data(node, ["id"])}</node>\n'
+      for node in nodes
+    )
+    f.writelines(
+      f'    <edge source={quoteattr(edge["source"])} target={quoteattr(edge["target"])}>'
+      f'{format_data(edge, ["source", "target"])}</edge>\n'
+      for edge in edges
+    )
+    f.write('  </graph>\n')
+    f.write('</graphml>\n')
+
+NETWORK_WRITERS = {
+  'graphml': write_network_graphml,
+  'json': write_network_json,
+  'tsv': write_network_tsv,
+}
+
+def write_interactions(graph, input_ids, options):
+  '''
+  Write the network in the requested format (see NETWORK_WRITERS).
+  '''
+  NETWORK_WRITERS[options.network_format](graph, input_ids, options)
+
+def build_db_command():
+  options = parse_build_db_args(sys.argv[2:])
+  build_local_database(options.tab3, options.biogrid_db)
 
 if __name__ == '__main__':
-  get_interactions()
+  if sys.argv[1:2] == ['build-db']:
+    build_db_command()
+  else:
+    get_interactions()
@@ -1,19 +1,57 @@
 from os import access
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import concurrent.futures
+import json
+import os
 import pyfakefs.fake_filesystem_unittest
+import requests
+import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 
 from .main import (
+  ISPREY,
+  KNOWN,
+  add_edge,
+  add_source,
+  build_local_database,
   consolidate_symbols,
+  create_graph,
   create_post_data,
+  evict_cache,
   extract_interaction_pairs,
+  fetch_cached_interactions,
+  fetch_interactions,
+  fetch_secondary_interactions_locally,
+  fetch_sharded_interactions,
+  graph_to_dict,
+  iterate_edges,
+  iterate_in_order,
+  iterate_json_values,
   map_identifiers,
   merge_input_interactions,
+  open_cache,
+  query_local_interactions,
   read_id_map,
   read_identifiers,
+  split_interactions_by_gene,
   write_biogrid_data,
+  write_cache,
   write_interactions,
 )
 
+def graph_from_dict(interactions):
+  graph = create_graph()
+  for source, source_data in interactions.items():
+    add_source(graph, source, source_data['symbol'])
+    for target, target_data in source_data['targets'].items():
+      flags = (ISPREY if target_data.get('isprey') else 0) | (KNOWN if target_data.get('known') else 0)
+      add_edge(graph, source, target, target_data['symbol'], flags)
+  return graph
+
 class ReadIdentifiers(pyfakefs.fake_filesystem_unittest.TestCase):
   def setUp(self):
     self.setUpPyfakefs()
@@ -150,6 +188,14 @@ class ReadIdMap(pyfakefs.fake_filesystem_unittest.TestCase):
       '"refseqp": ["NP_66666"],\n'
       '"prevSymbol": [],\n'
       '"symbol": "FFF"\n'
+      '},\n'
+      '"7": {\n'
+      '"aliasSymbol": [],\n'
+      '"ensemblg": null,\n'
+      '"entrez": null,\n'
+      '"refseqp": [],\n'
+      '"prevSymbol": [],\n'
+      '"symbol": null\n'
       '}\n'
       '}\n'
     )
@@ -165,12 +211,12 @@ class ReadIdMap(pyfakefs.fake_filesystem_unittest.TestCase):
   def test_list_ids(self):
     options = self.get_test_options('refseqp')
     expected = {
-      'NP_11111': '111',
-      'NP_22222': '222',
-      'NP_02222': '222',
-      'NP_33333': '333',
-      'NP_55555': '555',
-      'NP_66666': '666',
+      'np_11111': '111',
+      'np_22222': '222',
+      'np_02222': '222',
+      'np_33333': '333',
+      'np_55555': '555',
+      'np_66666': '666',
     }
 
     self.assertEqual(read_id_map(options), expected)
@@ -178,11 +224,23 @@ class ReadIdMap(pyfakefs.fake_filesystem_unittest.TestCase):
   def test_string_id(self):
     options = self.get_test_options('ensemblg')
     expected = {
-      'ENSG00000000111': '111',
-      'ENSG00000000222': '222',
-      'ENSG00000000333': '333',
-      'ENSG00000000555': '555',
-      'ENSG00000000666': '666',
+      'ensg00000000111': '111',
+      'ensg00000000222': '222',
+      'ensg00000000333': '333',
+      'ensg00000000555': '555',
+      'ensg00000000666': '666',
+    }
+
+    self.assertEqual(read_id_map(options), expected)
+
+  def test_null_id(self):
+    options = self.get_test_options('entrez')
+    expected = {
+      '111': '111',
+      '222': '222',
+      '333': '333',
+      '555': '555',
+      '666': '666',
     }
 
     self.assertEqual(read_id_map(options), expected)
@@ -190,12 +248,11 @@ class ReadIdMap(pyfakefs.fake_filesystem_unittest.TestCase):
   def test_symbols(self):
     options = self.get_test_options('symbol')
     expected = {
-      'AAA': '111',
-      'BBB': '222',
-      'CCC': '333',
-      'EEE': '555',
-      'FFF': '666',
       'aaa': '111',
+      'bbb': '222',
+      'ccc': '333',
+      'eee': '555',
+      'fff': '666',
       'a1': '111',
       'bb': '222',
       'aa': '333',
@@ -208,11 +265,11 @@ class MapIdentifiers(unittest.TestCase):
   def test_id_mapping_only(self):
     ids = ['AAA', 'AAB', 'bbb']
     id_map = {
-      'AAA': '111',
-      'BBB': '222',
-      'CCC': '333',
-      'EEE': '555',
-      'FFF': '666',
+      'aaa': '111',
+      'bbb': '222',
+      'ccc': '333',
+      'eee': '555',
+      'fff': '666',
     }
     interactions = {}
 
@@ -229,11 +286,11 @@ class MapIdentifiers(unittest.TestCase):
   def test_id_and_interaction_mapping(self):
     ids = ['AAA', 'AAB', 'bbb']
     id_map = {
-      'AAA': '111',
-      'BBB': '222',
-      'CCC': '333',
-      'EEE': '555',
-      'FFF': '666',
+      'aaa': '111',
+      'bbb': '222',
+      'ccc': '333',
+      'eee': '555',
+      'fff': '666',
     }
     interactions = {
       'AAA': ['BBB', 'CCC', 'DDD'],
@@ -301,22 +358,483 @@ class CreatePostData(unittest.TestCase):
 
     self.assertEqual(create_post_data(options, ids), expected)
 
+class BiogridStandIn(BaseHTTPRequestHandler):
+  '''
+  Answers count and paged json requests like the BioGRID interactions endpoint.
+  '''
+  interactions = [
+    {
+      'BIOGRID_INTERACTION_ID': id,
+      'ENTREZ_GENE_A': '111',
+      'ENTREZ_GENE_B': str(id),
+      'ORGANISM_A': 9606,
+      'ORGANISM_B': 9606,
+    }
+    for id in range(1, 24)
+  ]
+  requests = []
+  # Seconds to wait before answering requests for a gene.
+  delays = {}
+
+  def do_POST(self):
+    length = int(self.headers['Content-Length'])
+    params = { key: value[0] for key, value in parse_qs(self.rfile.read(length).decode()).items() }
+    self.requests.append(params)
+
+    genes = params['geneList'].split('|')
+    time.sleep(max(self.delays.get(gene, 0) for gene in genes))
+    interactions = [
+      entry for entry in self.interactions
+      if entry['ENTREZ_GENE_A'] in genes or entry['ENTREZ_GENE_B'] in genes
+    ]
+
+    if params['format'] == 'count':
+      body = str(len(interactions))
+    else:
+      start = int(params['start'])
+      page = interactions[start:start + int(params['max'])]
+      body = json.dumps({ str(entry['BIOGRID_INTERACTION_ID']): entry for entry in page })
+
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/plain')
+    self.end_headers()
+    self.wfile.write(body.encode())
+
+  def log_message(self, format, *args):
+    pass
+
+class StandInServerMixin:
+  '''
+  Serves the handler class (BiogridStandIn by default) on a local port for each
+  test, at self.url. The handler's recorded requests are cleared first.
+  '''
+  handler = BiogridStandIn
+
+  def setUp(self):
+    self.handler.requests = []
+    self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler)
+    self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,))
+    self.thread.start()
+    self.addCleanup(self.stop_server)
+    self.url = f'http://127.0.0.1:{self.server.server_address[1]}/interactions/'
+
+  def stop_server(self):
+    self.server.shutdown()
+    self.server.server_close()
+    self.thread.join()
+
+class IterateInOrder(unittest.TestCase):
+  def test(self):
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def square(value):
+      nonlocal in_flight, max_in_flight
+      with lock:
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+      time.sleep(0.01 * (5 - value))
+      with lock:
+        in_flight -= 1
+      return value * value
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+      actual = list(iterate_in_order(executor, square, range(5), 2))
+
+    self.assertEqual(actual, [0, 1, 4, 9, 16])
+    self.assertEqual(max_in_flight, 2)
+
+class FetchInteractions(StandInServerMixin, unittest.TestCase):
+  def test_all(self):
+    data = { 'format': 'json', 'geneList': '111', 'max': 0 }
+    actual = list(fetch_interactions(data, url=self.url, workers=3, page_size=5))
+    self.assertEqual(actual, BiogridStandIn.interactions)
+
+    pages = sorted((request['start'], request['max']) for request in BiogridStandIn.requests if 'start' in request)
+    self.assertEqual(pages, [('0', '5'), ('10', '5'), ('15', '5'), ('20', '3'), ('5', '5')])
+
+  def test_max(self):
+    data = { 'format': 'json', 'geneList': '111', 'max': 12 }
+    actual = list(fetch_interactions(data, url=self.url, workers=2, page_size=5))
+    self.assertEqual(actual, BiogridStandIn.interactions[:12])
+
+class FetchShardedInteractions(StandInServerMixin, unittest.TestCase):
+  def setUp(self):
+    super().setUp()
+
+    class Options:
+      shard_size = 1
+      workers = 4
+    self.options = Options()
+
+  def tearDown(self):
+    BiogridStandIn.delays = {}
+
+  def get_data(self, genes):
+    return { 'format': 'json', 'geneList': genes, 'max': 0 }
+
+  def test_order_and_concurrency(self):
+    BiogridStandIn.delays = { str(id): 0.1 for id in range(1, 9) }
+    BiogridStandIn.delays['1'] = 0.3
+
+    start = time.perf_counter()
+    actual = list(fetch_sharded_interactions(self.get_data('1|2|3|4|5|6|7|8'), self.options, url=self.url))
+    seconds = time.perf_counter() - start
+
+    self.assertEqual(actual, BiogridStandIn.interactions[:8])
+    # Fetching shards one at a time takes 2 s (a count and a page request per shard).
+    self.assertLess(seconds, 1.5)
+
+  def test_duplicates(self):
+    actual = list(fetch_sharded_interactions(self.get_data('5|111|7'), self.options, url=self.url))
+    expected = [BiogridStandIn.interactions[4], *BiogridStandIn.interactions[:4], *BiogridStandIn.interactions[5:]]
+    self.assertEqual(actual, expected)
+
+  def test_error(self):
+    self.server.RequestHandlerClass = BiogridErrorStandIn
+    with self.assertRaises(requests.exceptions.HTTPError):
+      list(fetch_sharded_interactions(self.get_data('1|2'), self.options, url=self.url))
+
+class BiogridErrorStandIn(BaseHTTPRequestHandler):
+  def do_POST(self):
+    self.send_response(500)
+    self.end_headers()
+
+  def log_message(self, format, *args):
+    pass
+
+class FetchCachedInteractions(StandInServerMixin, unittest.TestCase):
+  def setUp(self):
+    super().setUp()
+    self.directory = tempfile.TemporaryDirectory()
+
+    class Options:
+      cache = os.path.join(self.directory.name, 'cache.sqlite')
+      cache_size = 500
+      cache_ttl = 30
+      workers = 2
+    self.options = Options()
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def get_data(self, genes):
+    return {
+      'format': 'json',
+      'geneList': genes,
+      'includeInteractors': True,
+      'includeInteractorInteractions': False,
+      'max': 0,
+      'taxId': 'All',
+    }
+
+  def get_fetched_genes(self):
+    genes = [request['geneList'] for request in BiogridStandIn.requests if request['format'] == 'count']
+    BiogridStandIn.requests = []
+    return genes
+
+  def test_missing_genes(self):
+    actual = fetch_cached_interactions(self.get_data('5|7'), self.options, url=self.url)
+    self.assertEqual(actual, [BiogridStandIn.interactions[4], BiogridStandIn.interactions[6]])
+    self.assertEqual(self.get_fetched_genes(), ['5|7'])
+
+    actual = fetch_cached_interactions(self.get_data('5|7|9|999'), self.options, url=self.url)
+    expected = [BiogridStandIn.interactions[4], BiogridStandIn.interactions[6], BiogridStandIn.interactions[8]]
+    self.assertEqual(actual, expected)
+    self.assertEqual(self.get_fetched_genes(), ['9|999'])
+
+    actual = fetch_cached_interactions(self.get_data('111|999'), self.options, url=self.url)
+    self.assertEqual(actual, BiogridStandIn.interactions)
+    self.assertEqual(self.get_fetched_genes(), ['111'])
+
+    fetch_cached_interactions(self.get_data('5|7|9|999'), self.options, url=self.url)
+    self.assertEqual(self.get_fetched_genes(), [])
+
+  def test_expired(self):
+    fetch_cached_interactions(self.get_data('5'), self.options, url=self.url)
+    self.get_fetched_genes()
+
+    self.options.cache_ttl = 0
+    fetch_cached_interactions(self.get_data('5'), self.options, url=self.url)
+    self.assertEqual(self.get_fetched_genes(), ['5'])
+
+  def test_size_limit(self):
+    self.options.cache_size = 0.0005
+    fetch_cached_interactions(self.get_data('111'), self.options, url=self.url)
+    fetch_cached_interactions(self.get_data('5'), self.options, url=self.url)
+    self.get_fetched_genes()
+
+    fetch_cached_interactions(self.get_data('5|111'), self.options, url=self.url)
+    self.assertEqual(self.get_fetched_genes(), ['111'])
+
+  def test_not_cacheable(self):
+    data = { **self.get_data('5'), 'max': 10 }
+    list(fetch_cached_interactions(data, self.options, url=self.url))
+    list(fetch_cached_interactions(data, self.options, url=self.url))
+    self.assertEqual(self.get_fetched_genes(), ['5', '5'])
+
+class EvictCache(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.connection = open_cache(os.path.join(self.directory.name, 'cache.sqlite'))
+
+  def tearDown(self):
+    self.connection.close()
+    self.directory.cleanup()
+
+  def get_cached_genes(self):
+    return [row[0] for row in self.connection.execute('SELECT gene FROM responses ORDER BY fetched, rowid')]
+
+  def test(self):
+    # Each response is 1000 bytes of serialized interactions.
+    for gene in ['1', '2', '3', '4', '5']:
+      write_cache(self.connection, { gene: ['x' * 996] }, 'query')
+
+    evict_cache(self.connection, 5000 / 1024 / 1024)
+    self.assertEqual(self.get_cached_genes(), ['1', '2', '3', '4', '5'])
+
+    write_cache(self.connection, { '6': ['x' * 996] }, 'query')
+    evict_cache(self.connection, 5000 / 1024 / 1024)
+    self.assertEqual(self.get_cached_genes(), ['3', '4', '5', '6'])
+
+class NetworkStandIn(BiogridStandIn):
+  interactions = [
+    {
+      'BIOGRID_INTERACTION_ID': id,
+      'ENTREZ_GENE_A': gene_a,
+      'ENTREZ_GENE_B': gene_b,
+      'ORGANISM_A': 9606,
+      'ORGANISM_B': 9606,
+    }
+    for id, gene_a, gene_b in [(1, '1', '2'), (2, '1', '3'), (3, '2', '3'), (4, '3', '4'), (5, '4', '5'), (6, '2', '3')]
+  ]
+  requests = []
+
+class FetchSecondaryInteractionsLocally(StandInServerMixin, unittest.TestCase):
+  handler = NetworkStandIn
+
+  def setUp(self):
+    super().setUp()
+    self.directory = tempfile.TemporaryDirectory()
+
+    class Options:
+      cache = os.path.join(self.directory.name, 'cache.sqlite')
+      cache_size = 500
+      cache_ttl = 30
+      workers = 2
+    self.options = Options()
+    self.data = {
+      'format': 'json',
+      'geneList': '1',
+      'includeInteractors': True,
+      'includeInteractorInteractions': True,
+      'max': 0,
+      'taxId': 'All',
+    }
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def get_fetched_genes(self):
+    genes = [request['geneList'] for request in NetworkStandIn.requests if request['format'] == 'count']
+    NetworkStandIn.requests = []
+    return genes
+
+  def test(self):
+    expected = [NetworkStandIn.interactions[index] for index in [0, 1, 2, 5]]
+
+    self.assertEqual(fetch_secondary_interactions_locally(self.data, self.options, url=self.url), expected)
+    self.assertEqual(self.get_fetched_genes(), ['1', '2|3'])
+
+    self.assertEqual(fetch_secondary_interactions_locally(self.data, self.options, url=self.url), expected)
+    self.assertEqual(self.get_fetched_genes(), [])
+
+  def test_without_cache(self):
+    self.options.cache = ''
+    expected = [NetworkStandIn.interactions[index] for index in [0, 1, 2, 5]]
+    self.assertEqual(fetch_secondary_interactions_locally(self.data, self.options, url=self.url), expected)
+
+class SplitInteractionsByGene(unittest.TestCase):
+  def test(self):
+    interactions = [
+      { 'BIOGRID_INTERACTION_ID': 1, 'ENTREZ_GENE_A': 111, 'ENTREZ_GENE_B': 222, 'ORGANISM_A': 9606, 'ORGANISM_B': 10090 },
+      { 'BIOGRID_INTERACTION_ID': 2, 'ENTREZ_GENE_A': 333, 'ENTREZ_GENE_B': 111, 'ORGANISM_A': 9606, 'ORGANISM_B': 9606 },
+      { 'BIOGRID_INTERACTION_ID': 3, 'ENTREZ_GENE_A': 111, 'ENTREZ_GENE_B': 111, 'ORGANISM_A': 9606, 'ORGANISM_B': 9606 },
+    ]
+    data = { 'taxId': '9606' }
+
+    expected = {
+      '111': [interactions[0], interactions[1], interactions[2]],
+      '222': [],
+      '444': [],
+    }
+    self.assertEqual(split_interactions_by_gene(interactions, ['111', '222', '444'], data), expected)
+
+class LocalDatabase(unittest.TestCase):
+  def setUp(self):
+    header = [
+      '#BioGRID Interaction ID', 'Entrez Gene Interactor A', 'Entrez Gene Interactor B',
+      'BioGRID ID Interactor A', 'BioGRID ID Interactor B', 'Systematic Name Interactor A',
+      'Systematic Name Interactor B', 'Official Symbol Interactor A', 'Official Symbol Interactor B',
+      'Synonyms Interactor A', 'Synonyms Interactor B', 'Experimental System',
+      'Experimental System Type', 'Author', 'Publication Source', 'Organism ID Interactor A',
+      'Organism ID Interactor B', 'Throughput', 'Score', 'Modification', 'Qualifications',
+      'Tags', 'Source Database',
+    ]
+    def row(id, a, b, system, organism_b='9606', throughput='High Throughput'):
+      return [
+        str(id), a, b, '-', '-', '-', '-', f'G{a}', f'G{b}', '-', '-', system, 'physical',
+        'Smith J (2020)', 'PUBMED:123', '9606', organism_b, throughput, '-', '-', '-', '-', 'BIOGRID',
+      ]
+    rows = [
+      row(4, '111', '222', 'Affinity Capture-MS'),
+      row(1, '111', '333', 'Two-hybrid', throughput='Low Throughput'),
+      row(2, '222', '333', 'Affinity Capture-MS'),
+      row(3, '444', '111', 'Affinity Capture-MS', organism_b='10090'),
+      row(5, '111', '111', 'Affinity Capture-MS'),
+      row(6, '555', '666', 'Affinity Capture-MS'),
+    ]
+
+    self.directory = tempfile.TemporaryDirectory()
+    tab3file = os.path.join(self.directory.name, 'biogrid.tab3.txt')
+    self.dbfile = os.path.join(self.directory.name, 'biogrid.sqlite')
+    with open(tab3file, 'w') as f:
+      for values in [header, *rows]:
+        f.write('\t'.join(values) + '\n')
+    build_local_database(tab3file, self.dbfile)
+
+  def tearDown(self):
+    self.directory.cleanup()
+
+  def get_data(self, **kwargs):
+    data = {
+      'geneList': '111',
+      'includeEvidence': False,
+      'includeInteractors': True,
+      'includeInteractorInteractions': False,
+      'interSpeciesExcluded': False,
+      'selfInteractionsExcluded': False,
+      'taxId': 'All',
+      'throughputTag': 'any',
+    }
+    data.update(kwargs)
+    return data
+
+  def get_ids(self, interactions):
+    return [interaction['BIOGRID_INTERACTION_ID'] for interaction in interactions]
+
+  def test_interaction_format(self):
+    data = self.get_data(geneList='111|333', includeInteractors=False, selfInteractionsExcluded=True)
+    expected = {
+      'BIOGRID_INTERACTION_ID': 1,
+      'ENTREZ_GENE_A': '111',
+      'ENTREZ_GENE_B': '333',
+      'BIOGRID_ID_A': '-',
+      'BIOGRID_ID_B': '-',
+      'SYSTEMATIC_NAME_A': '-',
+      'SYSTEMATIC_NAME_B': '-',
+      'OFFICIAL_SYMBOL_A': 'G111',
+      'OFFICIAL_SYMBOL_B': 'G333',
+      'SYNONYMS_A': '-',
+      'SYNONYMS_B': '-',
+      'EXPERIMENTAL_SYSTEM': 'Two-hybrid',
+      'EXPERIMENTAL_SYSTEM_TYPE': 'physical',
+      'PUBMED_AUTHOR': 'Smith J (2020)',
+      'PUBMED_ID': '123',
+      'ORGANISM_A': 9606,
+      'ORGANISM_B': 9606,
+      'THROUGHPUT': 'Low Throughput',
+      'QUANTITATION': '-',
+      'MODIFICATION': '-',
+      'QUALIFICATIONS': '-',
+      'TAGS': '-',
+      'SOURCEDB': 'BIOGRID',
+    }
+    self.assertEqual(query_local_interactions(self.dbfile, data), [expected])
+
+  def test_interactors(self):
+    data = self.get_data()
+    self.assertEqual(self.get_ids(query_local_interactions(self.dbfile, data)), [1, 3, 4, 5])
+
+  def test_interactor_interactions(self):
+    data = self.get_data(includeInteractorInteractions=True)
+    self.assertEqual(self.get_ids(query_local_interactions(self.dbfile, data)), [1, 2, 3, 4, 5])
+
+  def test_filters(self):
+    tests = [
+      (self.get_data(selfInteractionsExcluded=True), [1, 3, 4]),
+      (self.get_data(interSpeciesExcluded=True), [1, 4, 5]),
+      (self.get_data(taxId='10090'), [3]),
+      (self.get_data(geneList='444', taxId='9606'), [3]),
+      (self.get_data(throughputTag='low'), [1]),
+      (self.get_data(evidenceList='two-hybrid', includeEvidence=True), [1]),
+      (self.get_data(evidenceList='two-hybrid', includeEvidence=False), [3, 4, 5]),
+    ]
+    for data, expected in tests:
+      with self.subTest(data=data):
+        self.assertEqual(self.get_ids(query_local_interactions(self.dbfile, data)), expected)
+
+  def test_missing_database(self):
+    dbfile = os.path.join(self.directory.name, 'missing.sqlite')
+    with self.assertRaises(sqlite3.OperationalError):
+      query_local_interactions(dbfile, self.get_data())
+    self.assertFalse(os.path.exists(dbfile))
+
 class WriteBiogridData(pyfakefs.fake_filesystem_unittest.TestCase):
   def setUp(self):
     self.setUpPyfakefs()
 
   def test(self):
     interactions = [
-      { 'BIOGRID_INTERACTION_ID': 1, 'ENTREZ_GENE_A': '111', 'ENTREZ_GENE_B': '222' },
-      { 'BIOGRID_INTERACTION_ID': 2, 'ENTREZ_GENE_A': '333', 'ENTREZ_GENE_B': '444' },
-      { 'BIOGRID_INTERACTION_ID': 3, 'ENTREZ_GENE_A': '555', 'ENTREZ_GENE_B': '666' },
+      { 'BIOGRID_INTERACTION_ID': 1, 'ENTREZ_GENE_A': '111', 'ENTREZ_GENE_B': '222', 'OFFICIAL_SYMBOL_A': 'AAA', 'OFFICIAL_SYMBOL_B': 'BBB' },
+      { 'BIOGRID_INTERACTION_ID': 2, 'ENTREZ_GENE_A': '333', 'ENTREZ_GENE_B': '444', 'OFFICIAL_SYMBOL_A': 'CCC', 'OFFICIAL_SYMBOL_B': 'DDD' },
+      { 'BIOGRID_INTERACTION_ID': 3, 'ENTREZ_GENE_A': '555', 'ENTREZ_GENE_B': '666', 'OFFICIAL_SYMBOL_A': 'EEE', 'OFFICIAL_SYMBOL_B': 'FFF' },
+    ]
+
+    expected_file = (
+      'BIOGRID_INTERACTION_ID\tENTREZ_GENE_A\tENTREZ_GENE_B\tOFFICIAL_SYMBOL_A\tOFFICIAL_SYMBOL_B\n'
+      '1\t111\t222\tAAA\tBBB\n'
+      '2\t333\t444\tCCC\tDDD\n'
+      '3\t555\t666\tEEE\tFFF\n'
+    )
+    expected_pairs = [
+      { 'ENTREZ_GENE_A': '111', 'ENTREZ_GENE_B': '222', 'OFFICIAL_SYMBOL_A': 'AAA', 'OFFICIAL_SYMBOL_B': 'BBB' },
+      { 'ENTREZ_GENE_A': '333', 'ENTREZ_GENE_B': '444', 'OFFICIAL_SYMBOL_A': 'CCC', 'OFFICIAL_SYMBOL_B': 'DDD' },
+      { 'ENTREZ_GENE_A': '555', 'ENTREZ_GENE_B': '666', 'OFFICIAL_SYMBOL_A': 'EEE', 'OFFICIAL_SYMBOL_B': 'FFF' },
+    ]
+
+    actual_pairs = write_biogrid_data(iter(interactions))
+    with open('./biogrid-interactions.txt', 'r') as f:
+      actual_file = f.read()
+    self.assertEqual(actual_file, expected_file)
+    self.assertEqual(actual_pairs, expected_pairs)
+
+  def test_inconsistent_fields(self):
+    interactions = [
+      { 'BIOGRID_INTERACTION_ID': 1, 'ENTREZ_GENE_A': '111', 'ENTREZ_GENE_B': '222', 'OFFICIAL_SYMBOL_A': 'AAA', 'OFFICIAL_SYMBOL_B': 'BBB', 'TAGS': 'x' },
+      { 'BIOGRID_INTERACTION_ID': 2, 'ENTREZ_GENE_A': '333', 'ENTREZ_GENE_B': '444', 'OFFICIAL_SYMBOL_A': 'CCC', 'OFFICIAL_SYMBOL_B': 'DDD', 'SCORE': 1 },
+    ]
+
+    expected = (
+      'BIOGRID_INTERACTION_ID\tENTREZ_GENE_A\tENTREZ_GENE_B\tOFFICIAL_SYMBOL_A\tOFFICIAL_SYMBOL_B\tTAGS\n'
+      '1\t111\t222\tAAA\tBBB\tx\n'
+      '2\t333\t444\tCCC\tDDD\t\n'
+    )
+
+    write_biogrid_data(interactions)
+    with open('./biogrid-interactions.txt', 'r') as f:
+      actual = f.read()
+    self.assertEqual(actual, expected)
+
+  def test_unquoted_values(self):
+    interactions = [
+      { 'BIOGRID_INTERACTION_ID': 1, 'ENTREZ_GENE_A': '111', 'ENTREZ_GENE_B': '222', 'OFFICIAL_SYMBOL_A': 'A"A', 'OFFICIAL_SYMBOL_B': 'BBB', 'SCORE': None },
     ]
 
     expected = (
-      'BIOGRID_INTERACTION_ID\tENTREZ_GENE_A\tENTREZ_GENE_B\n'
-      '1\t111\t222\n'
-      '2\t333\t444\n'
-      '3\t555\t666\n'
+      'BIOGRID_INTERACTION_ID\tENTREZ_GENE_A\tENTREZ_GENE_B\tOFFICIAL_SYMBOL_A\tOFFICIAL_SYMBOL_B\tSCORE\n'
+      '1\t111\t222\tA"A\tBBB\tNone\n'
     )
 
     write_biogrid_data(interactions)
@@ -324,6 +842,49 @@ class WriteBiogridData(pyfakefs.fake_filesystem_unittest.TestCase):
       actual = f.read()
     self.assertEqual(actual, expected)
 
+  def test_no_interactions(self):
+    self.assertEqual(write_biogrid_data([]), [])
+    with open('./biogrid-interactions.txt', 'r') as f:
+      self.assertEqual(f.read(), '')
+
+class IterateJsonValues(unittest.TestCase):
+  def test(self):
+    values = [
+      { 'BIOGRID_INTERACTION_ID': 1, 'OFFICIAL_SYMBOL_A': 'A{,}"B', 'TAGS': ['x', 'y'] },
+      { 'BIOGRID_INTERACTION_ID': 2, 'OFFICIAL_SYMBOL_A': 'Δ' },
+    ]
+    text = json.dumps({ str(value['BIOGRID_INTERACTION_ID']): value for value in values }, indent=2)
+
+    for chunk_size in [1, 3, 7, len(text)]:
+      with self.subTest(chunk_size=chunk_size):
+        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+        self.assertEqual(list(iterate_json_values(chunks)), values)
+
+  def test_array(self):
+    self.assertEqual(list(iterate_json_values(['[', ']'])), [])
+    self.assertEqual(list(iterate_json_values(['[{"a"', ': 1}, {"a": 2}]'])), [{ 'a': 1 }, { 'a': 2 }])
+
+  def test_incomplete(self):
+    with self.assertRaises(ValueError):
+      list(iterate_json_values(['{"1": {"a": 1']))
+
+class IterateEdges(unittest.TestCase):
+  def test(self):
+    graph = create_graph()
+    add_source(graph, '111', 'AAA')
+    add_edge(graph, '111', '222', 'BBB')
+    add_source(graph, '333', 'CCC')
+    add_edge(graph, '333', '111', 'AAA', KNOWN)
+    add_edge(graph, '111', '444', 'DDD', ISPREY)
+    add_edge(graph, '111', '222', 'bbb', ISPREY)
+
+    expected = [
+      ('111', 'AAA', '222', 'bbb', True, False),
+      ('111', 'AAA', '444', 'DDD', True, False),
+      ('333', 'CCC', '111', 'AAA', False, True),
+    ]
+    self.assertEqual(list(iterate_edges(graph)), expected)
+
 class ExtractInterationPair(unittest.TestCase):
   def test(self):
     ids = ['111', '222']
@@ -362,7 +923,7 @@ class ExtractInterationPair(unittest.TestCase):
       },
     }
 
-    self.assertEqual(extract_interaction_pairs(biogrid_data, ids), expected)
+    self.assertEqual(graph_to_dict(extract_interaction_pairs(biogrid_data, ids), flags=False), expected)
 
 class MergeInputInteractions(unittest.TestCase):
   def test_no_input_interactions(self):
@@ -416,7 +977,8 @@ class MergeInputInteractions(unittest.TestCase):
         },
       },
     }
-    self.assertEqual(merge_input_interactions(interactions, input_interactions), expected)
+    actual = merge_input_interactions(graph_from_dict(interactions), input_interactions)
+    self.assertEqual(graph_to_dict(actual), expected)
 
   def test_with_input_interactions(self):
     input_interactions = {
@@ -485,7 +1047,8 @@ class MergeInputInteractions(unittest.TestCase):
         },
       },
     }
-    self.assertEqual(merge_input_interactions(interactions, input_interactions), expected)
+    actual = merge_input_interactions(graph_from_dict(interactions), input_interactions)
+    self.assertEqual(graph_to_dict(actual), expected)
 
 
 class ConsolidateTargetSymbols(unittest.TestCase):
@@ -547,7 +1110,8 @@ class ConsolidateTargetSymbols(unittest.TestCase):
         },
       },
     }
-    self.assertEqual(consolidate_symbols(id_type, interactions, input_ids, input_interactions), expected)
+    actual = consolidate_symbols(id_type, graph_from_dict(interactions), input_ids, input_interactions)
+    self.assertEqual(graph_to_dict(actual), expected)
 
   def test_with_input_interactions(self):
     id_type = 'symbol'
@@ -622,7 +1186,8 @@ class ConsolidateTargetSymbols(unittest.TestCase):
         },
       },
     }
-    self.assertEqual(consolidate_symbols(id_type, interactions, input_ids, input_interactions), expected)
+    actual = consolidate_symbols(id_type, graph_from_dict(interactions), input_ids, input_interactions)
+    self.assertEqual(graph_to_dict(actual), expected)
 
   def test_id_type_not_symbol(self):
     id_type = 'refseqp'
@@ -682,7 +1247,8 @@ class ConsolidateTargetSymbols(unittest.TestCase):
         },
       },
     }
-    self.assertEqual(consolidate_symbols(id_type, interactions, input_ids, input_interactions), expected)
+    actual = consolidate_symbols(id_type, graph_from_dict(interactions), input_ids, input_interactions)
+    self.assertEqual(graph_to_dict(actual), expected)
 
 class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
   def setUp(self):
@@ -722,6 +1288,7 @@ class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
       id_type = 'symbol'
       include_saint_interactions = True
       is_saint = True
+      network_format = 'tsv'
     options = Options()
 
     expected = (
@@ -736,7 +1303,7 @@ class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
       'ee\t555\tFFF\t666\tFalse\tTrue\n'
     )
 
-    write_interactions(interactions, input_ids, options)
+    write_interactions(graph_from_dict(interactions), input_ids, options)
     with open('./cytoscape.txt', 'r') as f:
       actual = f.read()
     self.assertEqual(actual, expected)
@@ -775,6 +1342,7 @@ class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
       id_type = 'symbol'
       include_saint_interactions = False
       is_saint = False
+      network_format = 'tsv'
     options = Options()
 
     expected = (
@@ -789,7 +1357,7 @@ class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
       'ee\t555\tFFF\t666\n'
     )
 
-    write_interactions(interactions, input_ids, options)
+    write_interactions(graph_from_dict(interactions), input_ids, options)
     with open('./cytoscape.txt', 'r') as f:
       actual = f.read()
     self.assertEqual(actual, expected)
@@ -828,6 +1396,7 @@ class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
       id_type = 'refseqp'
       include_saint_interactions = False
       is_saint = False
+      network_format = 'tsv'
     options = Options()
 
     expected = (
@@ -842,7 +1411,75 @@ class WriteInteractions(pyfakefs.fake_filesystem_unittest.TestCase):
       '\tee\t555\tFFF\t666\n'
     )
 
-    write_interactions(interactions, input_ids, options)
+    write_interactions(graph_from_dict(interactions), input_ids, options)
     with open('./cytoscape.txt', 'r') as f:
       actual = f.read()
-    self.assertEqual(actual, expected)
\ No newline at end of file
+    self.assertEqual(actual, expected)
+
+  def get_network(self):
+    graph = create_graph()
+    add_source(graph, '111', 'AAA')
+    add_edge(graph, '111', '222', 'BBB', KNOWN)
+    add_edge(graph, '111', '333', 'C&C', ISPREY)
+    add_source(graph, '222', 'BBB')
+    add_edge(graph, '222', '333', 'C&C', ISPREY | KNOWN)
+    return graph
+
+  def test_json(self):
+    input_ids = { '111': 'AAA', '222': 'BBB' }
+    class Options:
+      id_type = 'symbol'
+      include_saint_interactions = True
+      is_saint = True
+      network_format = 'json'
+    options = Options()
+
+    expected = {
+      'elements': {
+        'nodes': [
+          { 'data': { 'id': '111', 'name': 'AAA' } },
+          { 'data': { 'id': '222', 'name': 'BBB' } },
+          { 'data': { 'id': '333', 'name': 'C&C' } },
+        ],
+        'edges': [
+          { 'data': { 'id': 'e0', 'source': '111', 'target': '222', 'isprey': False, 'known': True } },
+          { 'data': { 'id': 'e1', 'source': '111', 'target': '333', 'isprey': True, 'known': False } },
+          { 'data': { 'id': 'e2', 'source': '222', 'target': '333', 'isprey': True, 'known': True } },
+        ],
+      },
+    }
+
+    write_interactions(self.get_network(), input_ids, options)
+    with open('./cytoscape.json', 'r') as f:
+      actual = json.load(f)
+    self.assertEqual(actual, expected)
+
+  def test_graphml(self):
+    input_ids = { '111': 'NP_11111', '222': 'NP_22222' }
+    class Options:
+      id_type = 'refseqp'
+      include_saint_interactions = False
+      is_saint = False
+      network_format = 'graphml'
+    options = Options()
+
+    expected = (
+      '<?xml version="1.0" encoding="UTF-8"?>\n'
+      '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+      '  <key id="name" for="node" attr.name="name" attr.type="string"/>\n'
+      '  <key id="input_id" for="node" attr.name="input ID" attr.type="string"/>\n'
+      '  <graph id="network" edgedefault="directed">\n'
+      '    <node id="111"><data key="name">AAA</data><data key="input_id">NP_11111</data></node>\n'
+      '    <node id="222"><data key="name">BBB</data><data key="input_id">NP_22222</data></node>\n'
+      '    <node id="333"><data key="name">C&amp;C</data><data key="input_id"></data></node>\n'
+      '    <edge source="111" target="222"></edge>\n'
+      '    <edge source="111" target="333"></edge>\n'
+      '    <edge source="222" target="333"></edge>\n'
+      '  </graph>\n'
+      '</graphml>\n'
+    )
+
+    write_interactions(self.get_network(), input_ids, options)
+    with open('./cytoscape.graphml', 'r') as f:
+      actual = f.read()
+    self.assertEqual(actual, expected)
@@ -1,11 +1,13 @@
 import argparse
+import collections
 import csv
 import datetime
+import numpy as np
 import os.path
 import pandas as pd
 import re
+import zipfile
 
-from openpyxl import load_workbook
 from pathlib import Path
 
 '''
@@ -18,44 +20,93 @@ python3 main.py \
 output: file-fixed.txt and summary.txt
 '''
 
+# Numerical dates such as 2021-09-21, which are written back as day-month (21-Sep).
+PATTERN_NUMERICAL_DATES = re.compile('^20\\d{2}-0*(\\d{1,2})-0*(\\d{1,2}).*')
+# Values that could be a gene symbol: a short token without spaces containing a letter.
+PATTERN_SYMBOL_LIKE = re.compile('^(?=.*[A-Za-z])[\\w.:/@-]{1,30}$')
+
 def fix_symbols():
   options = parse_args()
   
   is_excel = check_file_in_excel_format(options.file)
-  data = read_file(options.file, is_excel)
   symbols_to_fix = read_symbols_to_fix()
 
-  fixed, summary = fix_data(data, options.columns, symbols_to_fix)
+  if options.chunk_size > 0 and not is_excel:
+    summary = fix_text_file_in_chunks(options, symbols_to_fix)
+    write_summary(summary, is_excel, symbols_to_fix)
+    return
+
+  data = read_file(options.file, is_excel)
+  fixed, summary = fix_data(data, options.columns, symbols_to_fix, options.match, options.detect_columns)
   write_summary(summary, is_excel, symbols_to_fix)
   write_fixed_file(fixed, options.file, is_excel)
 
 def parse_args():
   parser = argparse.ArgumentParser(description='Fix gene symbols that have been converted to dates by excel')
 
+  parser.add_argument(
+    '--chunk_size', '-cs',
+    default=0,
+    help='For text files, read, fix and write this many rows at a time so that large files '
+      'are fixed in constant memory. 0 reads the whole file at once.',
+    type=int,
+  )
   parser.add_argument(
     '--columns', '-c',
     default='',
     help='Pipe-separated list of columns to fix. It will fix all columns if none are supplied.',
   )
+  parser.add_argument(
+    '--detect_columns', '-dc',
+    default=True,
+    help='If no columns are supplied, only fix columns that look like they contain gene symbols. '
+      'Numeric columns and columns with few symbol-like values are skipped.',
+    type=parse_bool,
+  )
   parser.add_argument(
     '--file', '-f',
     help='Text or Excel file',
     required=True,
   )
+  parser.add_argument(
+    '--match', '-m',
+    choices=['exact', 'substring'],
+    default='exact',
+    help='Report cells that are a symbol to fix (exact) or that contain one (substring). '
+      'Only exact matches are fixed.',
+  )
 
   return parser.parse_args()
 
+def parse_bool(value):
+  '''
+  Parse a command line boolean: y, yes, t, true, on and 1 are true, and n, no,
+  f, false, off and 0 are false, ignoring case.
+  '''
+  value = str(value).lower()
+  if value in ['y', 'yes', 't', 'true', 'on', '1']:
+    return True
+  if value in ['n', 'no', 'f', 'false', 'off', '0']:
+    return False
+  raise ValueError(f'invalid truth value {value!r}')
+
 def check_file_in_excel_format(filepath):
   '''
-  Checks if a file is in Excel format. Only .xlsx is acceptable.
+  Checks if a file is in Excel format. Only .xlsx is acceptable. Rather than
+  loading the workbook, this checks the file starts with the zip signature and
+  that the zip directory lists a workbook.
   '''
-  extension = os.path.splitext(filepath)[1]
+  with open(filepath, 'rb') as f:
+    if f.read(4) != b'PK\x03\x04':
+      return False
+
   try:
-    load_workbook(filepath)
-  except Exception as inst:
+    with zipfile.ZipFile(filepath) as archive:
+      names = set(archive.namelist())
+  except zipfile.BadZipFile:
     return False
-  else:
-    return True
+
+  return '[Content_Types].xml' in names and 'xl/workbook.xml' in names
 
 def read_file(filepath, is_excel):
   '''
@@ -103,15 +154,128 @@ def read_symbols_to_fix():
 
   return symbols_to_fix
 
-def fix_data(data, columns, symbols_to_fix):
+def create_automaton(patterns):
+  '''
+  Build an Aho-Corasick automaton for finding all patterns in a string in a single pass.
+  '''
+  goto = [{}]
+  output = [[]]
+  for pattern in patterns:
+    state = 0
+    for char in pattern:
+      if char not in goto[state]:
+        goto.append({})
+        output.append([])
+        goto[state][char] = len(goto) - 1
+      state = goto[state][char]
+    output[state].append(pattern)
+
+  fail = [0] * len(goto)
+  queue = collections.deque(goto[0].values())
+  while queue:
+    state = queue.popleft()
+    for char, next_state in goto[state].items():
+      queue.append(next_state)
+      fallback = fail[state]
+      while fallback and char not in goto[fallback]:
+        fallback = fail[fallback]
+      fail[next_state] = goto[fallback].get(char, 0)
+      output[next_state] = output[next_state] + output[fail[next_state]]
+
+  return { 'fail': fail, 'goto': goto, 'output': output }
+
+def find_patterns(automaton, text):
+  '''
+  Find all automaton patterns in text, in order of first occurrence.
+  '''
+  fail = automaton['fail']
+  goto = automaton['goto']
+  output = automaton['output']
+
+  found = {}
+  state = 0
+  for char in text:
+    while state and char not in goto[state]:
+      state = fail[state]
+    state = goto[state].get(char, 0)
+    for pattern in output[state]:
+      found[pattern] = True
+  return list(found.keys())
+
+def create_symbol_matcher(symbols, match='exact'):
+  '''
+  Create a function returning the symbols to fix in a cell value: the value itself
+  if it is a symbol (exact) or all symbols it contains (substring).
+  '''
+  if match == 'substring':
+    automaton = create_automaton(symbols)
+    return lambda value: find_patterns(automaton, value)
+
+  symbol_set = set(symbols)
+  return lambda value: [value] if value in symbol_set else []
+
+def is_gene_column(series, sample_size=1000, min_fraction=0.2):
+  '''
+  Guess if a column contains gene symbols from a sample of its values. Numeric columns
+  never do, while date columns may hold symbols Excel converted to dates. Otherwise at
+  least min_fraction of the sampled values must look like symbols or numerical dates.
+  '''
+  if pd.api.types.is_datetime64_any_dtype(series):
+    return True
+  if pd.api.types.is_numeric_dtype(series):
+    return False
+
+  values = series.dropna()
+  if len(values) == 0:
+    return False
+  if len(values) > sample_size:
+    values = values.sample(sample_size, random_state=0)
+
+  no_symbol_like = sum(
+    1 for value in values.astype(str)
+    if PATTERN_SYMBOL_LIKE.match(value) or PATTERN_NUMERICAL_DATES.match(value)
+  )
+  return no_symbol_like >= min_fraction * len(values)
+
+def create_symbol_fixer(symbols_to_fix, match='exact'):
+  '''
+  Create the symbol matcher and map of unambiguous symbols to their official symbol
+  used by fix_data.
+  '''
+  return {
+    'find_symbols': create_symbol_matcher(symbols_to_fix.keys(), match),
+    'unambiguous_map': {
+      symbol: symbol_data['official_symbols'][0]
+      for symbol, symbol_data in symbols_to_fix.items() if not symbol_data['ambiguous']
+    },
+  }
+
+def get_columns_to_fix(df, columns, detect_columns):
+  '''
+  Get the columns to fix from a pipe-separated list, or if none are specified, all columns
+  or with detect_columns only likely gene columns (see is_gene_column).
+  '''
+  if columns != '':
+    return columns.split('|')
+  if detect_columns:
+    return [column for column in df.columns.values.tolist() if is_gene_column(df[column])]
+  return df.columns.values.tolist()
+
+def fix_data(data, columns, symbols_to_fix, match='exact', detect_columns=False, fixer=None):
   '''
   Check columns for symbols to fix and fix them whenever they can be unambiguously assigned
-  to a single gene. As a first step in the process, anything that looks like
+  to a single gene. Each column is factorized so that all steps run once per unique value, and
+  the column is then rebuilt from the codes. As a first step in the process, anything that looks like
   a numerical date in the format of 2021-09-21 will get converted to its day-month representation
-  (e.g. 21-Sep). Then symbols are tested. It will return the fixed dataframe and summary of the changes.
+  (e.g. 21-Sep). Then symbols are tested (see create_symbol_matcher). Columns are selected
+  with get_columns_to_fix. A fixer (see create_symbol_fixer) can be passed in when fixing
+  data in several parts. It will return the fixed dataframe and summary of the changes,
+  with one (sheet, column, symbol, fixed) entry per symbol found in a column. Only cells
+  that are an unambiguous symbol are fixed, so symbols only found inside a cell are not.
   '''
-  columns_to_check = columns.split('|') if columns != '' else []
-  unambiguous_map = {symbol: symbol_data['official_symbols'][0] for symbol, symbol_data in symbols_to_fix.items() if not symbol_data['ambiguous']}
+  fixer = fixer or create_symbol_fixer(symbols_to_fix, match)
+  find_symbols = fixer['find_symbols']
+  unambiguous_map = fixer['unambiguous_map']
 
   def replace_numerical_date(matchobj):
     (month, day) = matchobj.groups()
@@ -119,26 +283,57 @@ def fix_data(data, columns, symbols_to_fix):
     return f'{day}-{month_abbr}'
 
   fixed = {}
-  pattern_numerical_dates = re.compile('^20\d{2}-0*(\d{1,2})-0*(\d{1,2}).*')
-  pattern_symbols_to_fix = '|'.join(symbols_to_fix.keys())
   summary = []
   for sheet, df in data.items():
     fixed[sheet] = df
-    range = columns_to_check if len(columns_to_check) > 0 else df.columns.values.tolist()
-    for column in range:
-      df[column] = df[column].astype(str).apply(lambda a: pattern_numerical_dates.sub(replace_numerical_date, a))
-      matches = df[df[column].str.contains(pattern_symbols_to_fix)][column]
-      unique_matches = pd.unique(matches)
-      column_summary = [(sheet, column, match) for match in pd.unique(matches)]
+    for column in get_columns_to_fix(df, columns, detect_columns):
+      codes, uniques = pd.factorize(df[column])
+      values = [
+        PATTERN_NUMERICAL_DATES.sub(replace_numerical_date, value)
+        for value in pd.Series(uniques, dtype=uniques.dtype).astype(str).tolist()
+      ]
+
+      matches = {}
+      for value in values:
+        for symbol in find_symbols(value):
+          matches[symbol] = matches.get(symbol, False) or (symbol == value and symbol in unambiguous_map)
+      column_summary = [(sheet, column, symbol, is_fixed) for symbol, is_fixed in matches.items()]
       summary.extend(column_summary)
 
-      fixed[sheet][column] = df[column].map(unambiguous_map).fillna(df[column])
+      # Missing values have code -1 and are kept missing.
+      fixed_values = np.array([*(unambiguous_map.get(value, value) for value in values), np.nan], dtype=object)
+      fixed[sheet][column] = fixed_values[codes]
 
   return fixed, summary
 
+def fix_text_file_in_chunks(options, symbols_to_fix):
+  '''
+  Fix a tab-delimited text file options.chunk_size rows at a time, appending each fixed
+  chunk to the output file. Columns to fix are selected from the first chunk. Returns
+  the summary of changes over all chunks.
+  '''
+  fixer = create_symbol_fixer(symbols_to_fix, options.match)
+  outfile = get_fixed_filepath(options.file, False)
+
+  columns = None
+  summary = {}
+  with open(outfile, 'w', newline='') as f:
+    for index, chunk in enumerate(pd.read_csv(options.file, sep='\t', chunksize=options.chunk_size)):
+      if columns is None:
+        columns = get_columns_to_fix(chunk, options.columns, options.detect_columns)
+
+      fixed, chunk_summary = { 'sheet': chunk }, []
+      if len(columns) > 0:
+        fixed, chunk_summary = fix_data(fixed, '|'.join(columns), symbols_to_fix, fixer=fixer)
+      for *key, is_fixed in chunk_summary:
+        summary[tuple(key)] = summary.get(tuple(key), False) or is_fixed
+      fixed['sheet'].to_csv(f, sep='\t', index=False, header=index == 0)
+
+  return [(*key, is_fixed) for key, is_fixed in summary.items()]
+
 def write_summary(summary, is_excel, symbols_to_fix):
   '''
-  Write a summary of changed symbols.
+  Write a summary of changed symbols (see fix_data).
   '''
   start, end = (0, 5) if is_excel else (1, 5)
 
@@ -150,24 +345,27 @@ def write_summary(summary, is_excel, symbols_to_fix):
 
     for entry in summary:
       f.write('\t'.join(entry[start:3]))
-      f.write(f'\t{not symbols_to_fix[entry[2]]["ambiguous"]}')
+      f.write(f'\t{entry[3]}')
       f.write(f'\t{", ".join(symbols_to_fix[entry[2]]["official_symbols"])}')
       f.write('\n')
 
+def get_fixed_filepath(filepath, is_excel):
+  base = os.path.basename(filepath)
+  filename = os.path.splitext(base)[0]
+  extension = 'xlsx' if is_excel else 'txt'
+  return f'{filename}-fixed.{extension}'
+
 def write_fixed_file(data, filepath, is_excel):
   '''
   Write the original file with fixed symbols in the correct input format.
   '''
-  base = os.path.basename(filepath)
-  filename = os.path.splitext(base)[0]
+  outfile = get_fixed_filepath(filepath, is_excel)
 
   if is_excel:
-    outfile = f'{filename}-fixed.xlsx'
     with pd.ExcelWriter(outfile) as writer:
       for sheet, df in data.items():
         df.to_excel(writer, index=False, sheet_name=sheet)
   else:
-    outfile = f'{filename}-fixed.txt'
     data['sheet'].to_csv(outfile, sep='\t', index=False)
 
 if __name__ == '__main__':
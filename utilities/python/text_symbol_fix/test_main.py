@@ -3,18 +3,34 @@ import pandas as pd
 import pandas.testing as pd_testing
 import pyfakefs.fake_filesystem_unittest
 import unittest
+import zipfile
 
 from os import access
 
 from .main import (
   check_file_in_excel_format,
+  create_symbol_matcher,
   fix_data,
+  fix_text_file_in_chunks,
+  is_gene_column,
+  parse_bool,
   read_file,
   read_symbols_to_fix,
   write_fixed_file,
   write_summary,
 )
 
+class ParseBool(unittest.TestCase):
+  def test(self):
+    for value in ['y', 'yes', 'T', 'True', 'on', '1', True]:
+      self.assertIs(parse_bool(value), True)
+    for value in ['n', 'No', 'f', 'FALSE', 'off', '0', False]:
+      self.assertIs(parse_bool(value), False)
+
+  def test_invalid(self):
+    with self.assertRaises(ValueError):
+      parse_bool('maybe')
+
 class CheckFileInExcelFormat(pyfakefs.fake_filesystem_unittest.TestCase):
   def setUp(self):
     self.setUpPyfakefs()
@@ -48,6 +64,19 @@ class CheckFileInExcelFormat(pyfakefs.fake_filesystem_unittest.TestCase):
 
     self.assertTrue(check_file_in_excel_format(filepath))
 
+  def test_other_zip_file(self):
+    filepath = '/file.zip'
+    with zipfile.ZipFile(filepath, 'w') as archive:
+      archive.writestr('file.txt', 'column1\tcolumn2\n')
+
+    self.assertFalse(check_file_in_excel_format(filepath))
+
+  def test_empty_file(self):
+    filepath = '/test/file.txt'
+    self.fs.create_file(filepath, contents='')
+
+    self.assertFalse(check_file_in_excel_format(filepath))
+
 class ReadFile(pyfakefs.fake_filesystem_unittest.TestCase):
   def assertDataframeEqual(self, a, b, msg):
     try:
@@ -111,6 +140,37 @@ class ReadSymbolsToFix(pyfakefs.fake_filesystem_unittest.TestCase):
 
     self.assertEqual(read_symbols_to_fix(), expected)
 
+class CreateSymbolMatcher(unittest.TestCase):
+  def test_exact(self):
+    find_symbols = create_symbol_matcher(['1-Sep', '11-Sep', '5-Mar'])
+    self.assertEqual(find_symbols('1-Sep'), ['1-Sep'])
+    self.assertEqual(find_symbols('11-Sep'), ['11-Sep'])
+    self.assertEqual(find_symbols('11-Sep-2021'), [])
+    self.assertEqual(find_symbols('AAA'), [])
+
+  def test_substring(self):
+    find_symbols = create_symbol_matcher(['1-Sep', '11-Sep', '5-Mar', 'Sep-53'], 'substring')
+    self.assertEqual(find_symbols('1-Sep'), ['1-Sep'])
+    self.assertEqual(find_symbols('11-Sep'), ['11-Sep', '1-Sep'])
+    self.assertEqual(find_symbols('AAA;5-Mar;11-Sep-53'), ['5-Mar', '11-Sep', '1-Sep', 'Sep-53'])
+    self.assertEqual(find_symbols('AAA'), [])
+
+class IsGeneColumn(unittest.TestCase):
+  def test(self):
+    tests = [
+      (pd.Series(['AAA', 'MARCH5', '1-Sep', 'C1orf112']), True),
+      (pd.Series(['2021-03-05', '111', '222', '333', '444']), True),
+      (pd.Series(pd.to_datetime(['2021-03-05', '2021-09-01'])), True),
+      (pd.Series([1, 2, 3]), False),
+      (pd.Series([1.5, 2.5, None]), False),
+      (pd.Series(['111', '222', '333']), False),
+      (pd.Series(['a protein complex', 'seen in two replicates', 'low abundance', 'high abundance', 'AAA', 'c d']), False),
+      (pd.Series([None, None], dtype=object), False),
+    ]
+    for series, expected in tests:
+      with self.subTest(series=series.tolist()):
+        self.assertEqual(is_gene_column(series), expected)
+
 class FixData(pyfakefs.fake_filesystem_unittest.TestCase):
   def assertDataframeEqual(self, a, b, msg):
     try:
@@ -160,9 +220,9 @@ class FixData(pyfakefs.fake_filesystem_unittest.TestCase):
       ])
     }
     expected_summary = [
-      ('sheet', 'column1', '1-Sep'),
-      ('sheet', 'column1', '4-Oct'),
-      ('sheet', 'column3', '5-Mar'),
+      ('sheet', 'column1', '1-Sep', False),
+      ('sheet', 'column1', '4-Oct', True),
+      ('sheet', 'column3', '5-Mar', True),
     ]
     actual_fixed, actual_summary = fix_data(data, columns, symbols_to_fix)
     self.assertEqual(actual_fixed['sheet'], expected_fixed['sheet'])
@@ -174,14 +234,168 @@ class FixData(pyfakefs.fake_filesystem_unittest.TestCase):
   def test_no_columns(self):
     self._test_fixed_data('')
 
+  def test_detect_columns(self):
+    notes = ['a protein complex', 'seen in two replicates', 'low abundance', 'used as bait', 'not a prey', 'negative control']
+    data = {
+      'sheet': pd.DataFrame({
+        'gene': ['4-Oct', 'AAA', 'BBB', 'CCC', 'DDD', 'EEE', 'FFF'],
+        'notes': [*notes, '4-Oct'],
+        'spectral count': [1, 2, 3, 4, 5, 6, 7],
+      })
+    }
+    symbols_to_fix = {
+      '4-Oct': {
+        'ambiguous': False,
+        'converted_symbols': ['Oct4'],
+        'official_symbols': ['POU5F1'],
+      },
+    }
+
+    expected_fixed = pd.DataFrame({
+      'gene': ['POU5F1', 'AAA', 'BBB', 'CCC', 'DDD', 'EEE', 'FFF'],
+      'notes': [*notes, '4-Oct'],
+      'spectral count': [1, 2, 3, 4, 5, 6, 7],
+    })
+    expected_summary = [('sheet', 'gene', '4-Oct', True)]
+
+    actual_fixed, actual_summary = fix_data(data, '', symbols_to_fix, detect_columns=True)
+    self.assertEqual(actual_fixed['sheet'], expected_fixed)
+    self.assertEqual(actual_summary, expected_summary)
+
+  def test_missing_values(self):
+    data = {
+      'sheet': pd.DataFrame({
+        'column1': ['5-Mar', None, '2021-03-05', 'AAA', None],
+        'column2': [1, 2, 1, 2, 1],
+      })
+    }
+    symbols_to_fix = {
+      '5-Mar': {
+        'ambiguous': False,
+        'converted_symbols': ['MARCH5'],
+        'official_symbols': ['MARCHF5'],
+      },
+    }
+
+    expected_fixed = pd.DataFrame({
+      'column1': ['MARCHF5', float('nan'), 'MARCHF5', 'AAA', float('nan')],
+      'column2': ['1', '2', '1', '2', '1'],
+    })
+    expected_summary = [('sheet', 'column1', '5-Mar', True)]
+
+    actual_fixed, actual_summary = fix_data(data, '', symbols_to_fix)
+    self.assertEqual(actual_fixed['sheet'], expected_fixed)
+    self.assertEqual(actual_summary, expected_summary)
+
+  def test_substring(self):
+    data = {
+      'sheet': pd.DataFrame([
+        { 'column1': '1-Sep' },
+        { 'column1': '1-Sep;4-Oct' },
+        { 'column1': '11-Sep' },
+      ])
+    }
+    symbols_to_fix = {
+      '4-Oct': {
+        'ambiguous': False,
+        'converted_symbols': ['Oct4'],
+        'official_symbols': ['POU5F1'],
+      },
+      '1-Sep': {
+        'ambiguous': True,
+        'converted_symbols': ['SEP1', 'SEPT1'],
+        'official_symbols': ['XRN1', 'SEPTIN1'],
+      },
+    }
+
+    expected_fixed = pd.DataFrame([
+      { 'column1': '1-Sep' },
+      { 'column1': '1-Sep;4-Oct' },
+      { 'column1': '11-Sep' },
+    ])
+    expected_summary = [
+      ('sheet', 'column1', '1-Sep', False),
+      ('sheet', 'column1', '4-Oct', False),
+    ]
+    _, actual_exact_summary = fix_data({ 'sheet': data['sheet'].copy() }, '', symbols_to_fix)
+    actual_fixed, actual_summary = fix_data(data, '', symbols_to_fix, 'substring')
+    self.assertEqual(actual_exact_summary, expected_summary[:1])
+    self.assertEqual(actual_fixed['sheet'], expected_fixed)
+    self.assertEqual(actual_summary, expected_summary)
+
+class FixTextFileInChunks(pyfakefs.fake_filesystem_unittest.TestCase):
+  def setUp(self):
+    self.setUpPyfakefs()
+
+  def test(self):
+    file_contents = (
+      'gene\tcount\tnotes\n'
+      '2021-03-05\t1\tAAA BBB\n'
+      'AAA\t2\tAAA BBB\n'
+      '1-Sep\t3\tAAA BBB\n'
+      '4-Oct\t4\tAAA BBB\n'
+      '5-Mar\t5\t5-Mar\n'
+      'BBB\t6\tAAA BBB\n'
+      '1-Sep\t7\tAAA BBB\n'
+    )
+    filepath = '/test/file.txt'
+    self.fs.create_file(filepath, contents=file_contents)
+    symbols_to_fix = {
+      '5-Mar': {
+        'ambiguous': False,
+        'converted_symbols': ['MARCH5'],
+        'official_symbols': ['MARCHF5'],
+      },
+      '4-Oct': {
+        'ambiguous': False,
+        'converted_symbols': ['Oct4'],
+        'official_symbols': ['POU5F1'],
+      },
+      '1-Sep': {
+        'ambiguous': True,
+        'converted_symbols': ['SEP1', 'SEPT1'],
+        'official_symbols': ['XRN1', 'SEPTIN1'],
+      },
+    }
+
+    class Options:
+      chunk_size = 3
+      columns = ''
+      detect_columns = True
+      file = filepath
+      match = 'exact'
+    options = Options()
+
+    expected_file = (
+      'gene\tcount\tnotes\n'
+      'MARCHF5\t1\tAAA BBB\n'
+      'AAA\t2\tAAA BBB\n'
+      '1-Sep\t3\tAAA BBB\n'
+      'POU5F1\t4\tAAA BBB\n'
+      'MARCHF5\t5\t5-Mar\n'
+      'BBB\t6\tAAA BBB\n'
+      '1-Sep\t7\tAAA BBB\n'
+    )
+    expected_summary = [
+      ('sheet', 'gene', '5-Mar', True),
+      ('sheet', 'gene', '1-Sep', False),
+      ('sheet', 'gene', '4-Oct', True),
+    ]
+
+    actual_summary = fix_text_file_in_chunks(options, symbols_to_fix)
+    with open('./file-fixed.txt', 'r') as f:
+      actual_file = f.read()
+    self.assertEqual(actual_file, expected_file)
+    self.assertEqual(actual_summary, expected_summary)
+
 class WriteSummary(pyfakefs.fake_filesystem_unittest.TestCase):
   def setUp(self):
     self.setUpPyfakefs()
 
   def _test_written_summary(self, is_excel, expected):
     summary = [
-      ('sheet1', 'column1', '1-Sep'),
-      ('sheet1', 'column3', '5-Mar'),
+      ('sheet1', 'column1', '1-Sep', False),
+      ('sheet1', 'column3', '5-Mar', True),
     ]
     symbols_to_fix = {
       '5-Mar': {
@@ -219,6 +433,44 @@ class WriteSummary(pyfakefs.fake_filesystem_unittest.TestCase):
 
     self._test_written_summary(False, expected)
 
+  def test_substring(self):
+    data = {
+      'sheet': pd.DataFrame([
+        { 'column1': '1-Sep;4-Oct' },
+        { 'column1': '5-Mar' },
+      ])
+    }
+    symbols_to_fix = {
+      '4-Oct': {
+        'ambiguous': False,
+        'converted_symbols': ['Oct4'],
+        'official_symbols': ['POU5F1'],
+      },
+      '5-Mar': {
+        'ambiguous': False,
+        'converted_symbols': ['MARCH5'],
+        'official_symbols': ['MARCHF5'],
+      },
+      '1-Sep': {
+        'ambiguous': True,
+        'converted_symbols': ['SEP1', 'SEPT1'],
+        'official_symbols': ['XRN1', 'SEPTIN1'],
+      },
+    }
+
+    expected = (
+      'column\toriginal symbol\tfixed\tcorrect(ed) symbol(s)\n'
+      'column1\t1-Sep\tFalse\tXRN1, SEPTIN1\n'
+      'column1\t4-Oct\tFalse\tPOU5F1\n'
+      'column1\t5-Mar\tTrue\tMARCHF5\n'
+    )
+
+    _, summary = fix_data(data, '', symbols_to_fix, 'substring')
+    write_summary(summary, False, symbols_to_fix)
+    with open('./summary.txt', 'r') as f:
+      actual = f.read()
+    self.assertEqual(actual, expected)
+
 class WriteFixedFile(pyfakefs.fake_filesystem_unittest.TestCase):
   def assertDataframeEqual(self, a, b, msg):
     try: